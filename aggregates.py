@@ -0,0 +1,144 @@
+import json
+import math
+
+from codec import column_value, sort_key
+
+FUNCTIONS = ("count", "min", "max", "sum", "avg")
+BOUNDS = ("min", "max")
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def is_orderable(value):
+    # Same ordering as the column indexes, limited to scalars that survive the JSON header
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, (bool, int, str))
+
+
+def new_column():
+    return {"count": 0, "numbers": 0, "sum": 0, "min": None, "max": None}
+
+
+def new_stats(num_columns):
+    return {"count": 0, "columns": [new_column() for _ in range(num_columns)]}
+
+
+def add_value(column, value):
+    if value is None:
+        return
+    column["count"] += 1
+    if is_number(value):
+        column["numbers"] += 1
+        column["sum"] += value
+    if is_orderable(value):
+        if "min" in column and (column["min"] is None or sort_key(value) < sort_key(column["min"])):
+            column["min"] = value
+        if "max" in column and (column["max"] is None or sort_key(value) > sort_key(column["max"])):
+            column["max"] = value
+
+
+def remove_value(column, value):
+    if value is None:
+        return
+    column["count"] -= 1
+    if is_number(value):
+        column["numbers"] -= 1
+        column["sum"] = column["sum"] - value if column["numbers"] else 0
+    if is_orderable(value):
+        # The next smallest or largest value is unknown, drop the bound until a full pass restores it
+        for bound in BOUNDS:
+            if bound in column and column[bound] is not None and sort_key(column[bound]) == sort_key(value):
+                del column[bound]
+    if column["count"] <= 0:
+        column.update(new_column())
+
+
+def row_values(stats, row):
+    for column_index, column in enumerate(stats["columns"]):
+        try:
+            yield column, column_value(row, column_index)
+        except IndexError:
+            continue
+
+
+def add_row(stats, row):
+    stats["count"] += 1
+    for column, value in row_values(stats, row):
+        add_value(column, value)
+
+
+def remove_row(stats, row):
+    stats["count"] -= 1
+    for column, value in row_values(stats, row):
+        remove_value(column, value)
+
+
+def is_exact(stats):
+    return stats is not None and all(bound in column for column in stats["columns"] for bound in BOUNDS)
+
+
+def parse_rows_line(line):
+    # "rows: N", followed by the table statistics as JSON in tables written since they were added
+    num_rows, _, stats = line.strip().split(": ", 1)[1].partition(" ")
+    return int(num_rows), json.loads(stats) if stats else None
+
+
+def format_rows_line(num_rows, stats, padding=0):
+    if stats is None:
+        return f"rows: {num_rows}"
+    # Spare room lets deletes rewrite the statistics in place when they grow a little
+    return f"rows: {num_rows} {json.dumps(stats)}" + " " * padding
+
+
+class Aggregation:
+    def __init__(self, aggregates):
+        for function, column_index in aggregates:
+            if function not in FUNCTIONS:
+                raise ValueError(f"Unknown aggregate function: {function}")
+            if column_index is None and function != "count":
+                raise ValueError(f"{function} needs a column")
+        self.aggregates = aggregates
+        self.count = 0
+        self.columns = {column_index: new_column() for _, column_index in aggregates if column_index is not None}
+
+    @classmethod
+    def from_stats(cls, aggregates, stats):
+        # None when the statistics can't answer every aggregate without reading the rows
+        aggregation = cls(aggregates)
+        if stats is None:
+            return None
+        for function, column_index in aggregates:
+            if column_index is None:
+                continue
+            if column_index >= len(stats["columns"]) or \
+                    function in BOUNDS and function not in stats["columns"][column_index]:
+                return None
+            aggregation.columns[column_index] = stats["columns"][column_index]
+        aggregation.count = stats["count"]
+        return aggregation
+
+    def add(self, row):
+        self.count += 1
+        for column_index, column in self.columns.items():
+            try:
+                add_value(column, column_value(row, column_index))
+            except IndexError:
+                continue
+
+    def result(self, function, column_index):
+        if column_index is None:
+            return self.count
+        column = self.columns[column_index]
+        if function == "count":
+            return column["count"]
+        if function == "sum":
+            return column["sum"] if column["numbers"] else None
+        if function == "avg":
+            return column["sum"] / column["numbers"] if column["numbers"] else None
+        return column[function]
+
+    def results(self):
+        return [self.result(function, column_index) for function, column_index in self.aggregates]
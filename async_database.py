@@ -0,0 +1,110 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from text_database_manager import TextDatabase
+
+PAGE_SIZE = 1000
+
+
+class AsyncTextDatabase:
+    def __init__(self, filename, max_workers=4, page_size=PAGE_SIZE, **kwargs):
+        self.db = TextDatabase(filename, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.page_size = page_size
+        self.pending = {}
+        self.table_locks = {}
+        self.flushes = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def close(self):
+        await asyncio.gather(*self.flushes, return_exceptions=True)
+        await self.run(self.db.close)
+        self.executor.shutdown(wait=True)
+
+    async def list_tables(self):
+        return await self.run(self.db.list_tables)
+
+    async def check_table_exists(self, table_name):
+        return await self.run(self.db.check_table_exists, table_name)
+
+    async def get_table_columns(self, table_name):
+        return await self.run(self.db.get_table_columns, table_name)
+
+    async def add_table(self, table_name, columns=[]):
+        return await self.run(self.db.add_table, table_name, columns)
+
+    async def delete_table(self, table_name):
+        return await self.run(self.db.delete_table, table_name)
+
+    async def view_table(self, table_name):
+        return await self.run(self.db.view_table, table_name)
+
+    async def delete_row_from_table(self, table_name, row):
+        return await self.run(self.db.delete_row_from_table, table_name, row)
+
+    async def add_rows_to_table(self, table_name, rows):
+        return await self.run(self.db.add_rows_to_table, table_name, list(rows))
+
+    async def add_row_to_table(self, table_name, row):
+        row = self.db.encode_row(row)
+        future = asyncio.get_running_loop().create_future()
+        if table_name not in self.pending:
+            self.pending[table_name] = []
+            task = asyncio.ensure_future(self.flush(table_name))
+            self.flushes.add(task)
+            task.add_done_callback(self.flushes.discard)
+        self.pending[table_name].append((row, future))
+        await future
+
+    async def flush(self, table_name):
+        # Inserts queue up while the previous write for this table is running and go out as one write
+        lock = self.table_locks.setdefault(table_name, asyncio.Lock())
+        async with lock:
+            batch = self.pending.pop(table_name, [])
+            if not batch:
+                return
+            try:
+                await self.run(self.db.add_rows_to_table, table_name, [row for row, future in batch])
+            except Exception as e:
+                for row, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for row, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    async def iter_table(self, table_name, start=0, limit=None):
+        # Each page is its own read, so the read lock is never held while the consumer has the rows.
+        # The next page is read while the current one is consumed. Rows deleted in between move later pages.
+        position = max(start, 0)
+        stop = None if limit is None else position + max(limit, 0)
+
+        def read_page(position):
+            size = self.page_size if stop is None else min(self.page_size, stop - position)
+            return list(self.db.iter_table(table_name, position, size)) if size > 0 else []
+
+        pending = asyncio.ensure_future(self.run(read_page, position))
+        try:
+            while True:
+                page = await pending
+                if not page:
+                    break
+                position += len(page)
+                pending = asyncio.ensure_future(self.run(read_page, position))
+                for row in page:
+                    yield row
+        finally:
+            if not pending.done():
+                pending.cancel()
+                await asyncio.wait([pending])
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_database_manager as tbm
+
+SIZES = [1000, 10000, 100000, 1000000]
+TABLES = 4
+COLUMNS = ["id", "name", "score"]
+
+
+def make_row(i):
+    return [i, f"row{i}", i * 0.5]
+
+
+def read_io():
+    # rchar/wchar count every byte passed through read/write syscalls, cached or not
+    try:
+        with open("/proc/self/io", "r") as io:
+            counters = dict(line.split(": ") for line in io.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def build_database(filename, size):
+    db = tbm.TextDatabase(filename)
+    per_table = size // TABLES
+    for t in range(TABLES):
+        db.add_table(f"table{t}", COLUMNS)
+        db.add_rows_to_table(f"table{t}", (make_row(i) for i in range(t * per_table, (t + 1) * per_table)))
+    return db
+
+
+def benchmarks(size):
+    per_table = size // TABLES
+    big = f"table{TABLES - 1}"
+    first = (TABLES - 1) * per_table
+    return {
+        "add_table": (lambda db, i: db.add_table(f"extra{i}", COLUMNS), None),
+        "add_row_to_table": (lambda db, i: db.add_row_to_table(big, make_row(size + i)), None),
+        "delete_row_from_table": (lambda db, i: db.delete_row_from_table(big, make_row(first + i)), None),
+        "delete_table": (lambda db, i: db.delete_table(f"scratch{i}"),
+                         lambda db, count: [db.add_table(f"scratch{i}", COLUMNS) for i in range(count)]),
+        "view_table": (lambda db, i: db.view_table(big), None),
+        "list_tables": (lambda db, i: db.list_tables(), None),
+    }
+
+
+def measure(db, operation, setup, repeat):
+    # One untimed extra call runs under tracemalloc, which would otherwise slow down the timed ones
+    if setup is not None:
+        setup(db, repeat + 1)
+
+    timings = []
+    read_before, written_before = read_io()
+    for i in range(repeat):
+        start = time.perf_counter()
+        operation(db, i)
+        timings.append(time.perf_counter() - start)
+    read_after, written_after = read_io()
+    median = statistics.median(timings)
+
+    tracemalloc.start()
+    operation(db, repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "repeat": repeat,
+        "seconds": sum(timings),
+        "median_seconds": median,
+        "ops_per_sec": 1 / median if median else None,
+        "peak_memory_bytes": peak,
+        "bytes_read": None,
+        "bytes_written": None,
+    }
+    if read_before is not None and read_after is not None:
+        result["bytes_read"] = (read_after - read_before) // repeat
+        result["bytes_written"] = (written_after - written_before) // repeat
+    return result
+
+
+def run(sizes, repeat, operations):
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="tdbm-bench-")
+    try:
+        for size in sizes:
+            filename = os.path.join(workdir, f"bench_{size}.db")
+            start = time.perf_counter()
+            db = build_database(filename, size)
+            print(f"{size} rows: built in {time.perf_counter() - start:.2f}s, {os.path.getsize(filename)} bytes")
+
+            results[str(size)] = {}
+            for name, (operation, setup) in benchmarks(size).items():
+                if operations and name not in operations:
+                    continue
+                result = measure(db, operation, setup, repeat)
+                results[str(size)][name] = result
+                print(f"  {name:<24}{result['ops_per_sec']:>12.1f} ops/s"
+                      f"{result['peak_memory_bytes'] / 1024:>12.0f} KiB peak")
+            db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for size, operations in results.items():
+        for name, result in operations.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if not previous or not previous.get("ops_per_sec") or not result["ops_per_sec"]:
+                continue
+            change = result["ops_per_sec"] / previous["ops_per_sec"] - 1
+            if change < -threshold:
+                regressions.append((size, name, previous["ops_per_sec"], result["ops_per_sec"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the TextDatabase hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="total rows per database")
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per operation")
+    parser.add_argument("--only", nargs="+", default=None, help="operations to run")
+    parser.add_argument("--output", default="bench_output.json", help="where to save the results")
+    parser.add_argument("--compare", default=None, help="earlier results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed ops/s drop before flagging")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.only)
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for size, name, before, after, change in regressions:
+            print(f"REGRESSION {name} at {size} rows: {before:.1f} -> {after:.1f} ops/s ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
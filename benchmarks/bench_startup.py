@@ -0,0 +1,73 @@
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import text_database_manager as tbm
+
+# Each scenario runs in a fresh interpreter so imports are paid every time, like a cron job would
+SCENARIOS = {
+    "import_cli": "import cli",
+    "open_read_only": "import text_database_manager as tbm; tbm.TextDatabase({path!r}, read_only=True).list_tables()",
+    "cli_command": "import cli; cli.main([{path!r}, '--read-only', '-c', 'tables'])",
+}
+
+
+def build_database(filename):
+    db = tbm.TextDatabase(filename)
+    db.add_table("table0", ["id", "name"])
+    db.add_rows_to_table("table0", ([i, f"row{i}"] for i in range(1000)))
+    db.close()
+
+
+def measure(code, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cold-start time against a budget")
+    parser.add_argument("--repeat", type=int, default=10, help="fresh interpreters per scenario")
+    parser.add_argument("--budget", type=float, default=0.15, help="allowed median seconds per scenario")
+    args = parser.parse_args()
+
+    baseline = measure("pass", args.repeat)
+    print(f"{'interpreter':<20}{baseline * 1000:>10.1f} ms")
+
+    workdir = tempfile.mkdtemp(prefix="tdbm-startup-")
+    over = []
+    try:
+        path = os.path.join(workdir, "startup.db")
+        build_database(path)
+        before = os.stat(path).st_mtime_ns
+        for name, code in SCENARIOS.items():
+            median = measure(code.format(path=path), args.repeat)
+            print(f"{name:<20}{median * 1000:>10.1f} ms")
+            if median > args.budget:
+                over.append((name, median))
+        if os.stat(path).st_mtime_ns != before:
+            print("Read-only opens modified the database file")
+            sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, median in over:
+        print(f"OVER BUDGET {name}: {median * 1000:.1f} ms > {args.budget * 1000:.0f} ms")
+    if over:
+        sys.exit(1)
+    print("Within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,147 +1,339 @@
 import text_database_manager as tbm
-from lexer import CustomLexer, PromptSession, style
+from query import parse_select
 import sys
 import os
-from tabulate import tabulate
-
-filename = ""
-if len(sys.argv) == 1:  # no file selected
-    print("Using temporary in-memory database.")
-    filename = "_temp.db"
-else:
-    filename = sys.argv[1]
-
-# Initialize the database connection
-try:
-    db = tbm.TextDatabase(filename)
-except Exception as e:
-    print(f"Error initializing database: {e}")
-    sys.exit(1)
+from itertools import islice
+
+PAGE_SIZE = 100
+
+# The UI dependencies are imported on first use, scripted runs with -c never load prompt_toolkit
+PromptSession = None
+
+KEYWORDS = {'help', 'tables', 'create', 'view', 'order', 'asc', 'desc', 'limit', 'offset', 'delete', 'insert', 'into', 'many', 'quit', 'with', 'index', 'remove', 'from', 'begin', 'commit', 'rollback', 'vacuum', 'select', 'where', 'join', 'on', 'group', 'by', 'count', 'min', 'max', 'sum', 'avg', 'stats'}
 
 help_text = \
 '''tables \t\t\t\t views all tables
 create <table> with <columns> \t creates table with columns
-view <table> \t\t\t views all rows in table
+create index <table>.<column> \t creates a persisted index on a column
+view <table> [order by <column> [desc]] [limit N] [offset M]
+\t\t\t\t views rows in table, page by page
+select <columns> from <table> [join <table> on <column> = <column>] [where <column> <op> <value>] [group by <column>]
+\t\t\t\t views matching rows, columns may be * or count/min/max/sum/avg(<column>)
 delete <table> \t\t\t deletes table
 insert <row> into <table> \t inserts row into table
+insert many into <table> [from <file>]  inserts one row per line of file or stdin
 remove <row> from <table> \t removes row from table
+vacuum \t\t\t\t reclaims space left by deleted rows and tables
+stats \t\t\t\t shows I/O counters and per-operation latencies
+begin \t\t\t\t starts a batch, changes are kept in memory
+commit \t\t\t\t writes the batch to the file in one go
+rollback \t\t\t discards the batch
 quit \t\t\t\t exits the program'''
 
-session = PromptSession(lexer=CustomLexer({'help', 'tables', 'create', 'view', 'delete', 'insert', 'into', 'quit', 'with', 'remove', 'from'}), style=style)
 
-while True:
+def tabulate(*args, **kwargs):
+    from tabulate import tabulate as render
+    return render(*args, **kwargs)
+
+
+def parse_view_options(args):
+    options = {}
+    tokens = iter(args)
+    for token in tokens:
+        if token == "order" and next(tokens, None) == "by":
+            options["order"] = next(tokens, None)
+        elif token in ("asc", "desc") and "order" in options:
+            options["desc"] = token == "desc"
+        elif token in ("limit", "offset"):
+            options[token] = next(tokens, None)
+        else:
+            raise ValueError(token)
+    if None in options.values():
+        raise ValueError("Missing value")
+    return options
+
+
+def create_session():
+    from lexer import CustomLexer, PromptSession as prompt_session, style
+    return (PromptSession or prompt_session)(lexer=CustomLexer(KEYWORDS), style=style)
+
+
+def parse_arguments(argv):
+    filename = None
+    commands = []
+    read_only = False
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument in ("-c", "--command"):
+            commands.append(next(arguments, ""))
+        elif argument in ("-r", "--read-only"):
+            read_only = True
+        elif filename is None:
+            filename = argument
+    return filename, commands, read_only
+
+
+def main(argv=None):
+    filename, commands, read_only = parse_arguments(sys.argv[1:] if argv is None else argv)
+    if filename is None:  # no file selected
+        print("Using temporary in-memory database.")
+        filename = "_temp.db"
+
+    # Initialize the database connection
     try:
-        command_line = session.prompt("db> ").strip()
-        command, *args = command_line.split()
+        db = tbm.open_database(filename, read_only=read_only)
     except Exception as e:
-        print(f"Error processing command: {e}")
-        continue
+        print(f"Error initializing database: {e}")
+        sys.exit(1)
 
-    if command == "help":
-        print(help_text)
+    commands = iter(commands) if commands else None
+    session = create_session() if commands is None else None
 
-    elif command == "tables":
+    while True:
         try:
-            tables = db.list_tables()
-            print(tables)
+            if commands is None:
+                command_line = session.prompt("db> ").strip()
+            else:
+                command_line = next(commands, None)
+                if command_line is None:
+                    break
+            command, *args = command_line.split()
         except Exception as e:
-            print(f"Error listing tables: {e}")
-
-    elif command == "create":
-        if len(args) < 3 or args[1] != "with":
-            print("Usage: create <table> with <columns>")
+            print(f"Error processing command: {e}")
             continue
 
-        table_name = args[0]
-        columns = args[2:]
+        if command == "help":
+            print(help_text)
 
-        try:
-            if db.check_table_exists(table_name):
-                print("Table already exists.")
-            else:
-                db.add_table(table_name, columns)
-                print(f"Table '{table_name}' created successfully.")
-        except Exception as e:
-            print(f"Error creating table: {e}")
+        elif command == "tables":
+            try:
+                tables = db.list_tables()
+                print(tables)
+            except Exception as e:
+                print(f"Error listing tables: {e}")
 
-    elif command == "view":
-        if not args:
-            print("Usage: view <table>")
-            continue
+        elif command == "create" and args[:1] == ["index"]:
+            if len(args) != 2 or "." not in args[1]:
+                print("Usage: create index <table>.<column>")
+                continue
 
-        table_name = args[0]
-        try:
-            if db.check_table_exists(table_name):
-                table = db.view_table(table_name)
-                if table:
-                    print(tabulate(table[1:], headers=table[0]))
+            table_name, column = args[1].rsplit(".", 1)
+            try:
+                if db.check_table_exists(table_name):
+                    db.create_column_index(table_name, column)
+                    print(f"Index on '{table_name}.{column}' created successfully.")
                 else:
-                    print("Table is empty.")
-            else:
-                print("Table does not exist.")
-        except Exception as e:
-            print(f"Error viewing table: {e}")
+                    print("Table does not exist.")
+            except Exception as e:
+                print(f"Error creating index: {e}")
 
-    elif command == "delete":
-        if not args:
-            print("Usage: delete <table>")
-            continue
+        elif command == "create":
+            if len(args) < 3 or args[1] != "with":
+                print("Usage: create <table> with <columns>")
+                continue
 
-        table_name = args[0]
-        try:
-            if db.check_table_exists(table_name):
-                db.delete_table(table_name)
-                print(f"Table '{table_name}' deleted successfully.")
-            else:
-                print("Table does not exist.")
-        except Exception as e:
-            print(f"Error deleting table: {e}")
+            table_name = args[0]
+            columns = args[2:]
 
-    elif command == "insert":
-        if len(args) < 3 or args[1] != "into":
-            print("Usage: insert <row> into <table>")
-            continue
+            try:
+                if db.check_table_exists(table_name):
+                    print("Table already exists.")
+                else:
+                    db.add_table(table_name, columns)
+                    print(f"Table '{table_name}' created successfully.")
+            except Exception as e:
+                print(f"Error creating table: {e}")
+
+        elif command == "view":
+            try:
+                options = parse_view_options(args[1:]) if args else None
+            except ValueError:
+                options = None
+            if options is None:
+                print("Usage: view <table> [order by <column> [desc]] [limit N] [offset M]")
+                continue
 
-        row_data = args[0]
-        table_name = args[2]
+            table_name = args[0]
+            try:
+                limit = int(options["limit"]) if "limit" in options else None
+                offset = int(options.get("offset", 0))
+                if db.check_table_exists(table_name):
+                    columns = db.get_table_columns(table_name)
+                    if "order" in options:
+                        rows = db.iter_sorted(table_name, options["order"], options.get("desc", False), offset, limit)
+                    else:
+                        rows = db.iter_table(table_name, offset, limit)
+                    page = list(islice(rows, PAGE_SIZE))
+                    if not page:
+                        print("Table is empty.")
+                    while page:
+                        print(tabulate(page, headers=columns))
+                        page = list(islice(rows, PAGE_SIZE))
+                else:
+                    print("Table does not exist.")
+            except Exception as e:
+                print(f"Error viewing table: {e}")
+
+        elif command == "select":
+            try:
+                query = parse_select(command_line)
+            except ValueError as e:
+                print(e)
+                continue
+
+            try:
+                if not db.check_table_exists(query.table) or query.join and not db.check_table_exists(query.join[0]):
+                    print("Table does not exist.")
+                elif query.join:
+                    other = query.join[0]
+                    columns = query.columns or [f"{table}.{column}" for table in (query.table, other) for column in db.get_table_columns(table)]
+                    rows = db.join(query.table, *query.join, query.columns)
+                    page = list(islice(rows, PAGE_SIZE))
+                    if not page:
+                        print("No matching rows.")
+                    while page:
+                        print(tabulate(page, headers=columns))
+                        page = list(islice(rows, PAGE_SIZE))
+                elif query.is_aggregate():
+                    rows = db.aggregate(query.table, query.aggregates, query.where, query.group_by)
+                    print(tabulate([query.project(row) for row in rows], headers=query.headers()))
+                else:
+                    columns = query.columns or db.get_table_columns(query.table)
+                    rows = db.select(query.table, query.columns, query.where)
+                    page = list(islice(rows, PAGE_SIZE))
+                    if not page:
+                        print("No matching rows.")
+                    while page:
+                        print(tabulate(page, headers=columns))
+                        page = list(islice(rows, PAGE_SIZE))
+            except Exception as e:
+                print(f"Error selecting rows: {e}")
+
+        elif command == "delete":
+            if not args:
+                print("Usage: delete <table>")
+                continue
+
+            table_name = args[0]
+            try:
+                if db.check_table_exists(table_name):
+                    db.delete_table(table_name)
+                    print(f"Table '{table_name}' deleted successfully.")
+                else:
+                    print("Table does not exist.")
+            except Exception as e:
+                print(f"Error deleting table: {e}")
+
+        elif command == "insert" and args[:2] == ["many", "into"]:
+            if len(args) not in (3, 5) or (len(args) == 5 and args[3] != "from"):
+                print("Usage: insert many into <table> [from <file>]")
+                continue
+
+            table_name = args[2]
+            try:
+                if db.check_table_exists(table_name):
+                    source = open(args[4], "r") if len(args) == 5 else sys.stdin
+                    try:
+                        rows = (line.rstrip('\n') for line in source if line.strip())
+                        added = db.add_rows_to_table(table_name, rows)
+                    finally:
+                        if source is not sys.stdin:
+                            source.close()
+                    print(f"{added} rows inserted into table '{table_name}'.")
+                else:
+                    print("Table does not exist.")
+            except Exception as e:
+                print(f"Error inserting rows: {e}")
+
+        elif command == "insert":
+            if len(args) < 3 or args[1] != "into":
+                print("Usage: insert <row> into <table>")
+                continue
+
+            row_data = args[0]
+            table_name = args[2]
         
-        try:
-            if db.check_table_exists(table_name):
-                db.add_row_to_table(table_name, row_data)
-                print(f"Row inserted into table '{table_name}'.")
-            else:
-                print("Table does not exist.")
-        except Exception as e:
-            print(f"Error inserting row: {e}")
+            try:
+                if db.check_table_exists(table_name):
+                    db.add_row_to_table(table_name, row_data)
+                    print(f"Row inserted into table '{table_name}'.")
+                else:
+                    print("Table does not exist.")
+            except Exception as e:
+                print(f"Error inserting row: {e}")
 
-    elif command == "remove":
-        if len(args) < 3 or args[1] != "from":
-            print("Usage: remove <row> from <table>")
-            continue
+        elif command == "remove":
+            if len(args) < 3 or args[1] != "from":
+                print("Usage: remove <row> from <table>")
+                continue
 
-        row_data = args[0]
-        table_name = args[2]
+            row_data = args[0]
+            table_name = args[2]
         
+            try:
+                if db.check_table_exists(table_name):
+                    db.delete_row_from_table(table_name, row_data)
+                    print(f"Row removed from table '{table_name}'.")
+                else:
+                    print("Table does not exist.")
+            except Exception as e:
+                print(f"Error removing row: {e}")
+
+        elif command == "vacuum":
+            try:
+                db.compact()
+                print("Database compacted.")
+            except Exception as e:
+                print(f"Error compacting database: {e}")
+
+        elif command == "stats":
+            try:
+                stats = db.stats()
+                print(tabulate(sorted(stats["counters"].items()), headers=["counter", "value"]))
+                latency = [[operation, summary["count"]] + [summary[key] * 1000 for key in ("mean", "p50", "p95", "p99", "max")]
+                           for operation, summary in sorted(stats["latency"].items())]
+                print(tabulate(latency, headers=["operation", "calls", "mean ms", "p50 ms", "p95 ms", "p99 ms", "max ms"], floatfmt=".3f"))
+            except Exception as e:
+                print(f"Error reading stats: {e}")
+
+        elif command == "begin":
+            try:
+                db.begin()
+                print("Batch started.")
+            except Exception as e:
+                print(f"Error starting batch: {e}")
+
+        elif command == "commit":
+            try:
+                db.commit()
+                print("Batch committed.")
+            except Exception as e:
+                print(f"Error committing batch: {e}")
+
+        elif command == "rollback":
+            try:
+                db.rollback()
+                print("Batch discarded.")
+            except Exception as e:
+                print(f"Error discarding batch: {e}")
+
+        elif command == "quit":
+            print("Exiting...")
+            break
+
+        else:
+            print(f"Unknown command: {command}")
+
+    # Optional: Read the file if it exists and print its content
+    if commands is None and os.path.isfile(filename):
         try:
-            if db.check_table_exists(table_name):
-                db.delete_row_from_table(table_name, row_data)
-                print(f"Row removed from table '{table_name}'.")
-            else:
-                print("Table does not exist.")
+            with open(filename, "r") as file:
+                print(file.read())
         except Exception as e:
-            print(f"Error removing row: {e}")
+            print(f"Error reading file '{filename}': {e}")
 
-    elif command == "quit":
-        print("Exiting...")
-        break
+    db.close()
 
-    else:
-        print(f"Unknown command: {command}")
 
-# Optional: Read the file if it exists and print its content
-if os.path.exists(filename):
-    try:
-        with open(filename, "r") as file:
-            print(file.read())
-    except Exception as e:
-        print(f"Error reading file '{filename}': {e}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import ast
+import json
+import math
+
+decoder = json.JSONDecoder()
+
+
+def sort_key(value):
+    if isinstance(value, (bool, int, float)):
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    return (2, repr(value))
+
+
+def column_value(row, column_index):
+    if isinstance(row, (list, tuple)):
+        return row[column_index]
+    if column_index == 0:
+        return row
+    raise IndexError("Row has no such column")
+
+
+def json_safe(value):
+    if value is None or isinstance(value, (str, bool, int)):
+        return True
+    if isinstance(value, float):
+        return math.isfinite(value)
+    if isinstance(value, list):
+        return all(json_safe(item) for item in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and json_safe(item) for key, item in value.items())
+    # Tuples, sets, bytes and friends only survive a round trip as Python literals
+    return False
+
+
+def encode_value(value):
+    if json_safe(value):
+        return json.dumps(value, ensure_ascii=False)
+    return repr(value)
+
+
+def decode_row(line):
+    # Rows written before the JSON codec are Python literals, json rejects those and we fall back
+    try:
+        return decoder.decode(line)
+    except ValueError:
+        return ast.literal_eval(line)
+
+
+def encode_row(row):
+    if isinstance(row, str):
+        try:
+            row = decode_row(row)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            raise ValueError(f"Row is not a valid literal: {row}")
+    if json_safe(row):
+        return json.dumps(row, ensure_ascii=False)
+    # The repr fallback can't spell everything (nan, inf, objects), a row that doesn't read back is refused
+    line = repr(row)
+    try:
+        readable = ast.literal_eval(line) == row
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        readable = False
+    if not readable:
+        raise ValueError(f"Row cannot be stored: {line}")
+    return line
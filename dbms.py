@@ -185,16 +185,18 @@ def deleteTable(file: TextIOWrapper, table_name):
     deleteTablesToMeta(file, table_name)
     
 
-os.remove("_temp.db")
-file = ""
-if len(sys.argv) == 1:  # no file selected
-    print("using temporary in-memory database")
-    file = "_temp.db"
-else:
-    file = sys.argv[1]
-
-if not os.path.exists(file):
-    create_file(file)
+if __name__ == "__main__":
+    file = ""
+    if len(sys.argv) == 1:  # no file selected
+        print("using temporary in-memory database")
+        file = "_temp.db"
+        if os.path.exists(file):
+            os.remove(file)
+    else:
+        file = sys.argv[1]
+
+    if not os.path.exists(file):
+        create_file(file)
 
 # with open(file, "r+") as f:
 #     updateUpdatedToMeta(f)
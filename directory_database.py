@@ -0,0 +1,299 @@
+import glob
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from joins import hash_join, join_projection, joined_rows, lookup_join
+from locking import DatabaseLock
+from metrics import Metrics
+from storage import clone_file
+from text_database_manager import TextDatabase
+
+CATALOG = "catalog"
+
+
+def table_method(name):
+    # Operations on a single table run against that table's own file
+    def method(self, table_name, *args, **kwargs):
+        return getattr(self.table(table_name), name)(table_name, *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+class DirectoryDatabase:
+    def __init__(self, path, read_only=False, metrics_hook=None, **options):
+        if read_only and not os.path.isdir(path):
+            raise FileNotFoundError(f"Database directory not found: {path}")
+        self.path = path
+        self.read_only = read_only
+        self.options = options
+        self.metrics = Metrics(metrics_hook)
+        self.catalog_filename = os.path.join(path, CATALOG)
+        self.catalog = None
+        self.databases = {}
+        self.databases_lock = threading.Lock()
+        self.in_batch = False
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self.lock = DatabaseLock(self.catalog_filename + ".lock", create=not read_only)
+        if not read_only:
+            with self.lock.exclusive():
+                if not os.path.exists(self.catalog_filename):
+                    self.write_catalog([])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def check_writable(self):
+        if self.read_only:
+            raise RuntimeError("Database is opened read-only")
+
+    def check_no_batch(self):
+        # The catalog isn't part of a batch, a rollback couldn't bring back a dropped table's file
+        if self.in_batch:
+            raise RuntimeError("Tables cannot be added or deleted during a batch")
+
+    def read_catalog(self):
+        with self.lock.shared():
+            try:
+                st = os.stat(self.catalog_filename)
+            except FileNotFoundError:
+                return []
+            key = (st.st_mtime_ns, st.st_size, st.st_ino)
+            if self.catalog is None or self.catalog[0] != key:
+                with open(self.catalog_filename, "r") as catalog:
+                    fields = dict(line.rstrip('\n').split(": ", 1) for line in catalog if ": " in line)
+                self.catalog = (key, fields)
+            return [list(table) for table in json.loads(self.catalog[1]["tables"])]
+
+    def write_catalog(self, tables):
+        now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        created = self.catalog[1]["created"] if self.catalog is not None else now
+        temp_filename = self.catalog_filename + ".tmp"
+        with open(temp_filename, "w") as catalog:
+            catalog.write(f"CATALOG\ncreated: {created}\nupdated: {now}\ntables: {json.dumps(tables)}\n")
+            catalog.flush()
+            os.fsync(catalog.fileno())
+        os.replace(temp_filename, self.catalog_filename)
+
+    def table_filename(self, table_name, tables):
+        base = re.sub(r"[^A-Za-z0-9_-]+", "_", table_name) or "table"
+        taken = {table[1] for table in tables} | set(os.listdir(self.path))
+        filename = f"{base}.db"
+        number = 1
+        while filename in taken:
+            filename = f"{base}_{number}.db"
+            number += 1
+        return filename
+
+    def open_table(self, filename):
+        return TextDatabase(os.path.join(self.path, filename), read_only=self.read_only, metrics=self.metrics, **self.options)
+
+    def table(self, table_name):
+        tables = dict(self.read_catalog())
+        with self.databases_lock:
+            db = self.databases.get(table_name)
+            if table_name not in tables:
+                # Another process may have dropped it since we opened it
+                if db is not None:
+                    self.databases.pop(table_name).close()
+                raise ValueError("Table not found")
+            if db is not None and db.filename != os.path.join(self.path, tables[table_name]):
+                self.databases.pop(table_name).close()
+                db = None
+            if db is None:
+                db = self.databases[table_name] = self.open_table(tables[table_name])
+            return db
+
+    def list_tables(self):
+        return [table[0] for table in self.read_catalog()]
+
+    def check_table_exists(self, table_name):
+        return table_name in self.list_tables()
+
+    def add_table(self, table_name, columns=[]):
+        self.check_writable()
+        self.check_no_batch()
+        with self.lock.exclusive():
+            tables = self.read_catalog()
+            if table_name in [table[0] for table in tables]:
+                raise ValueError("Table already exists")
+            filename = self.table_filename(table_name, tables)
+            db = self.open_table(filename)
+            try:
+                db.add_table(table_name, columns)
+                tables.append([table_name, filename])
+                self.write_catalog(tables)
+            except BaseException:
+                db.close()
+                raise
+        with self.databases_lock:
+            self.databases[table_name] = db
+
+    def delete_table(self, table_name):
+        self.check_writable()
+        self.check_no_batch()
+        with self.lock.exclusive():
+            tables = self.read_catalog()
+            filenames = dict(tables)
+            if table_name not in filenames:
+                raise ValueError("Table not found")
+            # Dropping the catalog entry is what deletes the table, the files are only cleanup after that
+            self.write_catalog([table for table in tables if table[0] != table_name])
+            with self.databases_lock:
+                db = self.databases.pop(table_name, None)
+            if db is not None:
+                db.close()
+            filename = os.path.join(self.path, filenames[table_name])
+            for path in [filename] + glob.glob(glob.escape(filename) + ".*"):
+                os.remove(path)
+
+    add_row_to_table = table_method("add_row_to_table")
+    add_rows_to_table = table_method("add_rows_to_table")
+    delete_row_from_table = table_method("delete_row_from_table")
+    check_row_exists = table_method("check_row_exists")
+    get_table_columns = table_method("get_table_columns")
+    view_table = table_method("view_table")
+    iter_table = table_method("iter_table")
+    iter_sorted = table_method("iter_sorted")
+    scan = table_method("scan")
+    select = table_method("select")
+    aggregate = table_method("aggregate")
+    create_hash_index = table_method("create_hash_index")
+    drop_hash_index = table_method("drop_hash_index")
+    create_column_index = table_method("create_column_index")
+    drop_column_index = table_method("drop_column_index")
+    has_column_index = table_method("has_column_index")
+    find_by_column_range = table_method("find_by_column_range")
+    find_by_column = table_method("find_by_column")
+
+    def join(self, left_table, right_table, left_column, right_column, columns=None):
+        left_db, right_db = self.table(left_table), self.table(right_table)
+        left_columns, right_columns = left_db.get_table_columns(left_table), right_db.get_table_columns(right_table)
+        for table_name, column, table_columns in ((left_table, left_column, left_columns), (right_table, right_column, right_columns)):
+            if column not in table_columns:
+                raise ValueError(f"Column not found: {table_name}.{column}")
+        projection = join_projection(left_table, left_columns, right_table, right_columns, columns)
+
+        sides = [(left_db, left_table, left_column, left_columns.index(left_column)),
+                 (right_db, right_table, right_column, right_columns.index(right_column))]
+        counts = [db.aggregate(table_name, [("count", None)])[0][0] for db, table_name, _, _ in sides]
+        build, probe = sides if counts[0] <= counts[1] else sides[::-1]
+        build_db, build_table, _, build_index = build
+        probe_db, probe_table, probe_column, probe_index = probe
+
+        if probe_db.buffer is None and probe_db.has_column_index(probe_table, probe_column):
+            pairs = lookup_join(list(build_db.iter_table(build_table)), build_index,
+                                lambda key: probe_db.find_by_column(probe_table, probe_column, key), probe_index)
+        else:
+            pairs = hash_join(build_db.iter_table(build_table), build_index, probe_db.iter_table(probe_table), probe_index)
+        return joined_rows(pairs, build is sides[0], projection)
+
+    def tables(self):
+        return [self.table(table[0]) for table in self.read_catalog()]
+
+    def compact(self, migrate=False):
+        self.check_writable()
+        for db in self.tables():
+            db.compact(migrate)
+
+    def migrate(self):
+        self.compact(migrate=True)
+
+    def begin(self):
+        # Each table keeps its own batch, a commit writes them one file at a time
+        if self.in_batch:
+            raise RuntimeError("A batch is already in progress")
+        begun = []
+        try:
+            for db in self.tables():
+                db.begin()
+                begun.append(db)
+        except BaseException:
+            for db in begun:
+                db.rollback()
+            raise
+        self.in_batch = True
+
+    def commit(self):
+        if not self.in_batch:
+            raise RuntimeError("No batch in progress")
+        for db in self.tables():
+            if db.buffer is not None:
+                db.commit()
+        self.in_batch = False
+
+    def rollback(self):
+        if not self.in_batch:
+            raise RuntimeError("No batch in progress")
+        for db in self.tables():
+            if db.buffer is not None:
+                db.rollback()
+        self.in_batch = False
+
+    @contextmanager
+    def batch(self):
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def snapshot(self):
+        # Each table is cloned as of its own moment, the catalog can't change until all of them are
+        parent, name = os.path.split(os.path.abspath(self.path))
+        directory = tempfile.mkdtemp(prefix=name + ".snapshot-", dir=parent)
+        try:
+            with self.lock.shared():
+                for table_name, filename in self.read_catalog():
+                    self.table(table_name).clone(os.path.join(directory, filename))
+                clone_file(self.catalog_filename, os.path.join(directory, CATALOG))
+            return DirectorySnapshot(directory)
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+    def export(self, path, backend="text"):
+        with self.lock.shared():
+            tables = self.read_catalog()
+            os.makedirs(path, exist_ok=True)
+            for table_name, filename in tables:
+                self.table(table_name).export(os.path.join(path, filename), backend)
+            # Written last, a directory without a catalog is not a database yet
+            clone_file(self.catalog_filename, os.path.join(path, CATALOG))
+
+    def stats(self):
+        stats = self.metrics.snapshot()
+        with self.databases_lock:
+            databases = list(self.databases.values())
+        stats['counters']['block_cache_hits'] = sum(db.block_cache.hits for db in databases)
+        stats['counters']['block_cache_misses'] = sum(db.block_cache.misses for db in databases)
+        stats['file_size'] = sum(os.path.getsize(os.path.join(self.path, table[1])) for table in self.read_catalog())
+        return stats
+
+    def close(self):
+        with self.databases_lock:
+            databases = list(self.databases.values())
+            self.databases = {}
+        for db in databases:
+            db.close()
+        self.lock.close()
+
+
+class DirectorySnapshot(DirectoryDatabase):
+    def __init__(self, path):
+        super().__init__(path, read_only=True)
+
+    def close(self):
+        super().close()
+        shutil.rmtree(self.path, ignore_errors=True)
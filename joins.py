@@ -0,0 +1,79 @@
+from codec import column_value, encode_value
+
+# Wraps join keys that aren't hashable, the sentinel keeps them apart from stored tuples
+UNHASHABLE = object()
+
+
+def join_key(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return (UNHASHABLE, encode_value(value))
+
+
+def join_value(row, column_index):
+    try:
+        return column_value(row, column_index)
+    except IndexError:
+        return None
+
+
+def row_list(row):
+    return list(row) if isinstance(row, (list, tuple)) else [row]
+
+
+def join_projection(left_table, left_columns, right_table, right_columns, columns):
+    # Columns are "table.column", or a bare name found in only one of the tables
+    if columns is None:
+        return None
+    projection = []
+    for column in columns:
+        table_name, dot, name = column.partition(".")
+        offset = 0
+        candidates = []
+        for side_table, side_columns in ((left_table, left_columns), (right_table, right_columns)):
+            if dot and table_name == side_table and name in side_columns:
+                candidates.append(offset + side_columns.index(name))
+            elif not dot and column in side_columns:
+                candidates.append(offset + side_columns.index(column))
+            offset += len(side_columns)
+        if not candidates:
+            raise ValueError(f"Column not found: {column}")
+        if len(candidates) > 1 and not dot:
+            raise ValueError(f"Ambiguous column: {column}")
+        projection.append(candidates[0])
+    return projection
+
+
+def hash_join(build_rows, build_index, probe_rows, probe_index):
+    table = {}
+    for build_row in build_rows:
+        key = join_value(build_row, build_index)
+        if key is not None:
+            table.setdefault(join_key(key), []).append(build_row)
+    for probe_row in probe_rows:
+        key = join_value(probe_row, probe_index)
+        if key is not None:
+            for build_row in table.get(join_key(key), ()):
+                yield build_row, probe_row
+
+
+def lookup_join(build_rows, build_index, lookup, probe_index):
+    # lookup(key) returns the candidate probe rows, usually from a column index
+    for build_row in build_rows:
+        key = join_value(build_row, build_index)
+        if key is None:
+            continue
+        for probe_row in lookup(key):
+            if join_value(probe_row, probe_index) == key:
+                yield build_row, probe_row
+
+
+def joined_rows(pairs, build_is_left, projection=None):
+    for build_row, probe_row in pairs:
+        if build_is_left:
+            row = row_list(build_row) + row_list(probe_row)
+        else:
+            row = row_list(probe_row) + row_list(build_row)
+        yield row if projection is None else [row[i] for i in projection]
@@ -0,0 +1,134 @@
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class ReadWriteLock:
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = {}
+        self.writer = None
+        self.writer_depth = 0
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer == me or me in self.readers:
+                self.readers[me] = self.readers.get(me, 0) + 1
+                return
+            # Waiting writers go first so a steady stream of readers can't starve them
+            while self.writer is not None or self.waiting_writers:
+                self.condition.wait()
+            self.readers[me] = 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self.condition:
+            self.readers[me] -= 1
+            if not self.readers[me]:
+                del self.readers[me]
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self.condition:
+            if self.writer == me:
+                self.writer_depth += 1
+                return
+            if me in self.readers:
+                raise RuntimeError("Cannot upgrade a read lock to a write lock")
+            self.waiting_writers += 1
+            try:
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+            finally:
+                self.waiting_writers -= 1
+            self.writer = me
+            self.writer_depth = 1
+
+    def release_write(self):
+        with self.condition:
+            self.writer_depth -= 1
+            if not self.writer_depth:
+                self.writer = None
+                self.condition.notify_all()
+
+
+class DatabaseLock:
+    def __init__(self, filename, create=True):
+        self.filename = filename
+        self.create = create
+        self.rwlock = ReadWriteLock()
+        self.file_mutex = threading.Lock()
+        self.file = None
+        self.holders = 0
+
+    def lock_file(self, operation):
+        with self.file_mutex:
+            if self.holders == 0 and fcntl is not None:
+                if self.file is None:
+                    self.file = self.open_lock_file()
+                if self.file is not None:
+                    fcntl.flock(self.file.fileno(), operation)
+            self.holders += 1
+
+    def unlock_file(self):
+        with self.file_mutex:
+            self.holders -= 1
+            if self.holders == 0 and self.file is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def open_lock_file(self):
+        if self.create:
+            return open(self.filename, "a")
+        # Read-only users don't create the lock file, when no writer made one there is nobody to wait for
+        try:
+            return open(self.filename, "r")
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def shared(self):
+        self.rwlock.acquire_read()
+        try:
+            self.lock_file(fcntl.LOCK_SH if fcntl else None)
+            try:
+                yield
+            finally:
+                self.unlock_file()
+        finally:
+            self.rwlock.release_read()
+
+    @contextmanager
+    def exclusive(self):
+        self.rwlock.acquire_write()
+        try:
+            self.lock_file(fcntl.LOCK_EX if fcntl else None)
+            try:
+                yield
+            finally:
+                self.unlock_file()
+        finally:
+            self.rwlock.release_write()
+
+    def pin(self):
+        # Keeps the file exclusively locked across calls, for batches and WAL mode
+        self.rwlock.acquire_write()
+        try:
+            self.lock_file(fcntl.LOCK_EX if fcntl else None)
+        finally:
+            self.rwlock.release_write()
+
+    def unpin(self):
+        self.unlock_file()
+
+    def close(self):
+        with self.file_mutex:
+            if self.file is not None and self.holders == 0:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,119 @@
+import functools
+import threading
+import time
+
+# Latency buckets double from 1 microsecond up to about a minute
+BUCKETS = [2 ** i / 1e6 for i in range(27)]
+
+# Same flag inspect.isgeneratorfunction checks, without importing inspect at startup
+CO_GENERATOR = 0x20
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        bucket = 0
+        while bucket < len(BUCKETS) and seconds > BUCKETS[bucket]:
+            bucket += 1
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        target = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(BUCKETS[bucket], self.max) if bucket < len(BUCKETS) else self.max
+        return 0.0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+        }
+
+
+class Metrics:
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, counts):
+        with self.lock:
+            for name, amount in counts.items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, operation, seconds):
+        with self.lock:
+            if operation not in self.histograms:
+                self.histograms[operation] = Histogram()
+            self.histograms[operation].observe(seconds)
+        if self.hook is not None:
+            self.hook(operation, seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'latency': {operation: histogram.summary() for operation, histogram in self.histograms.items()},
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+
+def timed(method):
+    name = method.__name__
+
+    if method.__code__.co_flags & CO_GENERATOR:
+        # Generators are charged for the time spent producing rows, not for the time the caller holds them
+        @functools.wraps(method)
+        def generator_wrapper(self, *args, **kwargs):
+            elapsed = 0.0
+            rows = method(self, *args, **kwargs)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        row = next(rows)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - start
+                    yield row
+            finally:
+                rows.close()
+                self.metrics.observe(name, elapsed)
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.metrics.observe(name, time.perf_counter() - start)
+    return wrapper
+
@@ -0,0 +1,145 @@
+import ast
+import operator
+import re
+
+from aggregates import FUNCTIONS
+
+OPERATORS = {
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+SELECT = re.compile(
+    r"select\s+(?P<columns>.+?)\s+from\s+(?P<table>\S+)"
+    r"(?:\s+join\s+(?P<join>\S+)\s+on\s+(?P<on_left>[^\s=]+)\s*==?\s*(?P<on_right>[^\s=]+))?"
+    r"(?:\s+where\s+(?P<column>[^\s=!<>]+)\s*(?P<op>==|!=|<=|>=|=|<|>)\s*(?P<value>.+?))?"
+    r"(?:\s+group\s+by\s+(?P<group_by>\S+))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+AGGREGATE = re.compile(r"(?P<function>\w+)\s*\(\s*(?P<column>[^()\s]+)\s*\)")
+
+# Strings made of these characters are stored verbatim in every row literal, so a raw line can be
+# rejected before decoding when it doesn't contain them
+PLAIN = re.compile(r"[A-Za-z0-9_ .@-]+")
+
+
+def parse_value(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_column(text):
+    match = AGGREGATE.fullmatch(text)
+    if match is None:
+        return text
+    function = match["function"].lower()
+    if function not in FUNCTIONS:
+        raise ValueError(f"Unknown aggregate function: {function}")
+    if match["column"] == "*" and function != "count":
+        raise ValueError(f"{function} needs a column")
+    return (function, None if match["column"] == "*" else match["column"])
+
+
+def parse_join(table, other, first, second):
+    # Returns (other, column of table, column of other), whichever order the on clause names them in
+    references = []
+    for reference in (first, second):
+        table_name, dot, column = reference.partition(".")
+        if dot and table_name not in (table, other):
+            raise ValueError(f"Unknown table in join: {table_name}")
+        references.append((table_name if dot else None, column if dot else reference))
+    if references[0][0] == other != table or references[1][0] == table != other:
+        references.reverse()
+    return (other, references[0][1], references[1][1])
+
+
+def parse_select(text):
+    match = SELECT.match(text.strip())
+    if match is None:
+        raise ValueError("Usage: select <columns> from <table> [join <table> on <column> = <column>] "
+                         "[where <column> <op> <value>] [group by <column>]")
+
+    columns = [column.strip() for column in match["columns"].split(",")]
+    if columns == ["*"]:
+        columns = None
+    elif not all(columns):
+        raise ValueError("Empty column name in select")
+    else:
+        columns = [parse_column(column) for column in columns]
+
+    where = None
+    if match["column"] is not None:
+        where = (match["column"], match["op"], parse_value(match["value"]))
+    query = Query(columns, match["table"], where, match["group_by"])
+
+    if match["join"] is not None:
+        if where is not None or query.is_aggregate():
+            raise ValueError("Joins can't be combined with where, group by or aggregates")
+        query.join = parse_join(match["table"], match["join"], match["on_left"], match["on_right"])
+
+    if query.is_aggregate():
+        plain = [column for column in query.columns or ["*"] if isinstance(column, str)]
+        if any(column != query.group_by for column in plain):
+            raise ValueError("Columns must be aggregated or be the group by column")
+    return query
+
+
+class Query:
+    def __init__(self, columns, table, where=None, group_by=None):
+        self.columns = columns
+        self.table = table
+        self.where = where
+        self.group_by = group_by
+        self.join = None
+
+    @property
+    def aggregates(self):
+        return [column for column in self.columns or [] if isinstance(column, tuple)]
+
+    def is_aggregate(self):
+        return bool(self.aggregates) or self.group_by is not None
+
+    def headers(self):
+        return [column if isinstance(column, str) else f"{column[0]}({column[1] or '*'})" for column in self.columns]
+
+    def project(self, row):
+        # Aggregate rows come back as the group value, if any, followed by one value per aggregate
+        offset = 0 if self.group_by is None else 1
+        aggregates = self.aggregates
+        return [row[0] if isinstance(column, str) else row[offset + aggregates.index(column)] for column in self.columns]
+
+
+class Condition:
+    def __init__(self, column_index, op, value):
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op}")
+        self.column_index = column_index
+        self.op = op
+        self.value = value
+
+    def matches_line(self, line):
+        if OPERATORS[self.op] is operator.eq and isinstance(self.value, str) and PLAIN.fullmatch(self.value):
+            return self.value in line
+        return True
+
+    def __call__(self, row):
+        if isinstance(row, (list, tuple)):
+            if self.column_index >= len(row):
+                return False
+            value = row[self.column_index]
+        elif self.column_index == 0:
+            value = row
+        else:
+            return False
+        try:
+            return OPERATORS[self.op](value, self.value)
+        except TypeError:
+            return False
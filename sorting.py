@@ -0,0 +1,87 @@
+import heapq
+import sys
+import tempfile
+
+SORT_MEMORY = 64 << 20
+MERGE_FANIN = 64
+
+
+def top_n(lines, key, limit, descending=False):
+    return (heapq.nlargest if descending else heapq.nsmallest)(limit, lines, key=key)
+
+
+def reverse_sorted(items, key):
+    # Like sorted(..., reverse=True) on already sorted items, equal keys stay in their original order
+    end = len(items)
+    while end:
+        start = end - 1
+        while start and key(items[start - 1]) == key(items[start]):
+            start -= 1
+        yield from items[start:end]
+        end = start
+
+
+def write_run(lines, temp_dir=None):
+    run = tempfile.TemporaryFile("w+", encoding="utf-8", dir=temp_dir)
+    try:
+        run.writelines(line + '\n' for line in lines)
+        run.seek(0)
+    except BaseException:
+        run.close()
+        raise
+    return run
+
+
+def read_run(run):
+    if isinstance(run, list):
+        yield from run
+        return
+    for line in run:
+        yield line.rstrip('\n')
+
+
+def sort_runs(lines, key, descending=False, memory_limit=SORT_MEMORY, temp_dir=None):
+    # Sorted runs of at most memory_limit bytes of lines, all of it in one list when nothing had to spill
+    runs = []
+    buffer = []
+    size = 0
+    try:
+        for line in lines:
+            buffer.append(line)
+            size += sys.getsizeof(line)
+            if size >= memory_limit:
+                buffer.sort(key=key, reverse=descending)
+                runs.append(write_run(buffer, temp_dir))
+                buffer = []
+                size = 0
+        buffer.sort(key=key, reverse=descending)
+        if not runs:
+            return [buffer]
+        if buffer:
+            runs.append(write_run(buffer, temp_dir))
+
+        # Keep the number of open run files bounded, merged runs stay in front so equal keys keep their order
+        while len(runs) > MERGE_FANIN:
+            merged = write_run(heapq.merge(*map(read_run, runs[:MERGE_FANIN]), key=key, reverse=descending), temp_dir)
+            close_runs(runs[:MERGE_FANIN])
+            runs = [merged] + runs[MERGE_FANIN:]
+        return runs
+    except BaseException:
+        close_runs(runs)
+        raise
+
+
+def merge_runs(runs, key, descending=False):
+    try:
+        if len(runs) == 1:
+            yield from read_run(runs[0])
+        else:
+            yield from heapq.merge(*map(read_run, runs), key=key, reverse=descending)
+    finally:
+        close_runs(runs)
+
+
+def close_runs(runs):
+    for run in runs:
+        if not isinstance(run, list):
+            run.close()
@@ -0,0 +1,592 @@
+import locale
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# Deleted lines are overwritten in place with this character, a row literal can never start with it
+TOMBSTONE = "~"
+
+# ioctl that makes a copy-on-write clone on Linux filesystems that share extents (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+def is_tombstone(line):
+    return line.startswith(TOMBSTONE)
+
+
+def clone_file(source, target):
+    if fcntl is not None and sys.platform.startswith("linux"):
+        with open(source, "rb") as source_file, open(target, "wb") as target_file:
+            try:
+                fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+                return True
+            except OSError:
+                pass
+    shutil.copyfile(source, target)
+    return False
+
+
+@contextmanager
+def counted(backend, file):
+    # Files count their reads and writes once per call, the totals go to the metrics when they are closed
+    try:
+        yield file
+    finally:
+        if backend.metrics is not None:
+            backend.metrics.merge(file.counts)
+
+
+class CountedFile:
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def count_lines(self, start, end):
+        self.count('line_reads', end - start)
+        self.count('bytes_read', self.backend.offsets[end] - self.backend.offsets[start])
+
+    def count_rewrite(self):
+        self.count('rewrites')
+        self.count('bytes_written', self.backend.offsets[-1])
+
+
+class LineBuffer:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def line_count(self):
+        return len(self.lines)
+
+    def readlines(self):
+        return self.lines
+
+    def write_lines(self, lines):
+        self.lines = lines
+
+    def overwrite_line(self, line_number, content=""):
+        if 0 <= line_number - 1 < len(self.lines):
+            self.lines[line_number - 1] = str(content) + '\n'
+        else:
+            raise IndexError("Line number out of range")
+
+    def overwrite_line_padded(self, line_number, content=""):
+        self.overwrite_line(line_number, content)
+
+    def insert_line(self, line_number, content=""):
+        self.lines.insert(line_number - 1, str(content) + '\n')
+
+    def append_line(self, content=""):
+        self.lines.extend(line + '\n' for line in content.split('\n'))
+
+    def read_line(self, line_number):
+        if not 0 < line_number <= len(self.lines):
+            raise IndexError("Line number out of range")
+        return self.lines[line_number - 1].rstrip('\n')
+
+    def read_lines(self, line_number, count):
+        return [line.rstrip('\n') for line in self.lines[line_number - 1:line_number - 1 + count]]
+
+    def iter_lines(self, line_number, count):
+        for line in self.lines[line_number - 1:line_number - 1 + count]:
+            yield line.rstrip('\n')
+
+    def read_bytes(self, line_number, count):
+        return "".join(self.lines[line_number - 1:line_number - 1 + count]).encode()
+
+    def tombstone_lines(self, line_number, count):
+        for i in range(line_number - 1, line_number - 1 + count):
+            self.lines[i] = TOMBSTONE * len(self.lines[i].rstrip('\n')) + '\n'
+
+    def delete_line(self, line_number):
+        if 0 <= line_number - 1 < len(self.lines):
+            del self.lines[line_number - 1]
+        else:
+            raise IndexError("Line number out of range")
+
+
+class MappedFile(CountedFile):
+    def __init__(self, backend, mapped):
+        self.backend = backend
+        self.mapped = mapped
+        self.offsets = backend.offsets
+        self.encoding = backend.encoding
+        self.counts = {}
+
+    def line_count(self):
+        return len(self.offsets) - 1
+
+    def read_line(self, line_number):
+        if not 0 < line_number < len(self.offsets):
+            raise IndexError("Line number out of range")
+        self.count_lines(line_number - 1, line_number)
+        return self.mapped[self.offsets[line_number - 1]:self.offsets[line_number]].decode(self.encoding).rstrip('\n')
+
+    def read_lines(self, line_number, count):
+        end = min(line_number - 1 + count, len(self.offsets) - 1)
+        self.count_lines(line_number - 1, end)
+        block = self.mapped[self.offsets[line_number - 1]:self.offsets[end]].decode(self.encoding)
+        return block.split('\n')[:-1]
+
+    def iter_lines(self, line_number, count):
+        end = min(line_number - 1 + count, len(self.offsets) - 1)
+        i = line_number - 1
+        try:
+            while i < end:
+                line = self.mapped[self.offsets[i]:self.offsets[i + 1]].decode(self.encoding).rstrip('\n')
+                i += 1
+                yield line
+        finally:
+            self.count_lines(line_number - 1, i)
+
+    def read_bytes(self, line_number, count):
+        self.count('bytes_read', self.offsets[line_number - 1 + count] - self.offsets[line_number - 1])
+        return self.mapped[self.offsets[line_number - 1]:self.offsets[line_number - 1 + count]]
+
+
+class TextFile(CountedFile):
+    def __init__(self, backend, file):
+        self.backend = backend
+        self.file = file
+        self.counts = {}
+
+    def line_count(self):
+        return len(self.backend.offsets) - 1
+
+    def line_size(self, content):
+        return len((str(content) + '\n').encode(self.file.encoding))
+
+    def shift_offsets(self, start, amount):
+        offsets = self.backend.offsets
+        for i in range(start, len(offsets)):
+            offsets[i] += amount
+
+    def written(self):
+        self.file.flush()
+        self.count('flushes')
+        self.backend.written()
+
+    def readlines(self):
+        self.file.seek(0)
+        self.count('full_reads')
+        self.count('bytes_read', self.backend.offsets[-1])
+        return self.file.readlines()
+
+    def rewrite(self, lines):
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.writelines(lines)
+
+    def write_lines(self, lines):
+        self.rewrite(lines)
+        self.backend.index_lines(lines)
+        self.count_rewrite()
+        self.written()
+
+    def overwrite_line(self, line_number, content=""):
+        offsets = self.backend.offsets
+        if not 0 < line_number < len(offsets):
+            raise IndexError("Line number out of range")
+
+        old_size = offsets[line_number] - offsets[line_number - 1]
+        if self.line_size(content) == old_size:
+            self.file.seek(offsets[line_number - 1])
+            self.file.write(str(content) + '\n')
+            self.count('bytes_written', old_size)
+            self.written()
+            return
+
+        lines = self.readlines()
+        lines[line_number - 1] = str(content) + '\n'
+        self.rewrite(lines)
+        self.shift_offsets(line_number, self.line_size(content) - old_size)
+        self.count_rewrite()
+        self.written()
+
+    def overwrite_line_padded(self, line_number, content=""):
+        offsets = self.backend.offsets
+        if 0 < line_number < len(offsets):
+            padding = offsets[line_number] - offsets[line_number - 1] - self.line_size(content)
+            if padding > 0:
+                content = str(content) + " " * padding
+        self.overwrite_line(line_number, content)
+
+    def tombstone_lines(self, line_number, count):
+        offsets = self.backend.offsets
+        if not 0 < line_number <= line_number + count - 1 < len(offsets):
+            raise IndexError("Line number out of range")
+
+        self.file.seek(offsets[line_number - 1])
+        self.file.write("".join(
+            TOMBSTONE * (offsets[i + 1] - offsets[i] - 1) + '\n'
+            for i in range(line_number - 1, line_number - 1 + count)
+        ))
+        self.count('bytes_written', offsets[line_number - 1 + count] - offsets[line_number - 1])
+        self.written()
+
+    def insert_line(self, line_number, content=""):
+        lines = self.readlines()
+        lines.insert(line_number - 1, str(content) + '\n')
+        self.rewrite(lines)
+
+        offsets = self.backend.offsets
+        position = min(max(line_number - 1, 0), len(offsets) - 1)
+        offsets.insert(position, offsets[position])
+        self.shift_offsets(position + 1, self.line_size(content))
+        self.count_rewrite()
+        self.written()
+
+    def append_line(self, content=""):
+        self.file.seek(0, 2)
+        self.file.write(content + '\n')
+
+        offsets = self.backend.offsets
+        start = offsets[-1]
+        for line in content.split('\n'):
+            offsets.append(offsets[-1] + self.line_size(line))
+        self.count('bytes_written', offsets[-1] - start)
+        self.written()
+
+    def read_line(self, line_number):
+        offsets = self.backend.offsets
+        if not 0 < line_number < len(offsets):
+            raise IndexError("Line number out of range")
+
+        self.file.seek(offsets[line_number - 1])
+        self.count_lines(line_number - 1, line_number)
+        return self.file.readline().rstrip('\n')
+
+    def read_lines(self, line_number, count):
+        return list(self.iter_lines(line_number, count))
+
+    def iter_lines(self, line_number, count):
+        end = min(line_number - 1 + count, len(self.backend.offsets) - 1)
+        self.file.seek(self.backend.offsets[line_number - 1])
+        i = line_number - 1
+        try:
+            while i < end:
+                line = self.file.readline()
+                if not line:
+                    return
+                i += 1
+                yield line.rstrip('\n')
+        finally:
+            self.count_lines(line_number - 1, i)
+
+    def read_bytes(self, line_number, count):
+        offsets = self.backend.offsets
+        self.count('bytes_read', offsets[line_number - 1 + count] - offsets[line_number - 1])
+        with open(self.backend.filename, "rb") as file:
+            file.seek(offsets[line_number - 1])
+            return file.read(offsets[line_number - 1 + count] - offsets[line_number - 1])
+
+    def delete_line(self, line_number):
+        offsets = self.backend.offsets
+        if not 0 < line_number < len(offsets):
+            raise IndexError("Line number out of range")
+
+        lines = self.readlines()
+        del lines[line_number - 1]
+        self.rewrite(lines)
+
+        size = offsets[line_number] - offsets[line_number - 1]
+        del offsets[line_number - 1]
+        self.shift_offsets(line_number - 1, -size)
+        self.count_rewrite()
+        self.written()
+
+
+class TextBackend:
+    name = "text"
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.encoding = locale.getpreferredencoding(False)
+        self.offsets = [0]
+        self.on_write = None
+        self.metrics = None
+
+    def written(self):
+        if self.on_write is not None:
+            self.on_write()
+
+    def build_index(self):
+        # offsets[i] is the byte offset of line i + 1, offsets[-1] is the file size
+        offsets = [0]
+        with open(self.filename, "rb") as file:
+            for line in file:
+                offsets.append(offsets[-1] + len(line))
+        self.offsets = offsets
+
+    def index_lines(self, lines):
+        offsets = [0]
+        for line in lines:
+            offsets.append(offsets[-1] + len(line.encode(self.encoding)))
+        self.offsets = offsets
+
+    def split_records(self, data):
+        return data.decode(self.encoding).split('\n')[:-1]
+
+    @contextmanager
+    def open(self, mode="r", use_mmap=False):
+        if use_mmap and mode == "r":
+            with open(self.filename, "rb") as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    with counted(self, MappedFile(self, mapped)) as mapped_file:
+                        yield mapped_file
+        else:
+            with open(self.filename, mode, encoding=self.encoding) as file, counted(self, TextFile(self, file)) as text_file:
+                yield text_file
+
+    def replace(self, lines):
+        temp_filename = self.filename + ".tmp"
+        offsets = [0]
+        with open(temp_filename, "w", encoding=self.encoding) as file:
+            for line in lines:
+                file.write(line)
+                offsets.append(offsets[-1] + len(line.encode(self.encoding)))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, self.filename)
+        self.offsets = offsets
+        if self.metrics is not None:
+            self.metrics.merge({'rewrites': 1, 'bytes_written': offsets[-1], 'flushes': 1, 'fsyncs': 1})
+
+
+MAGIC = b"TDBB"
+VERSION = 1
+# magic, version, reserved, record count, position of the packed offsets trailer (0 when stale)
+HEADER = struct.Struct("<4sHHQQ")
+LENGTH = struct.Struct("<I")
+
+
+def pack_offsets(offsets):
+    packed = array("Q", offsets)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_offsets(data):
+    offsets = array("Q")
+    offsets.frombytes(data)
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    return offsets.tolist()
+
+
+class BinaryFile(CountedFile):
+    def __init__(self, backend, file):
+        self.backend = backend
+        self.file = file
+        self.counts = {}
+
+    def line_count(self):
+        return len(self.backend.offsets) - 1
+
+    def written(self):
+        self.file.flush()
+        self.count('flushes')
+        self.backend.written()
+
+    def write_header(self, count, trailer_position):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0, count, trailer_position))
+
+    def readlines(self):
+        self.count('full_reads')
+        return [line + '\n' for line in self.iter_lines(1, self.line_count())]
+
+    def write_lines(self, lines):
+        self.file.seek(0)
+        self.file.truncate()
+        self.backend.offsets = self.backend.write_records(self.file, lines)
+        self.count_rewrite()
+        self.written()
+
+    def overwrite_line(self, line_number, content=""):
+        offsets = self.backend.offsets
+        if not 0 < line_number < len(offsets):
+            raise IndexError("Line number out of range")
+
+        payload = str(content).encode()
+        if LENGTH.size + len(payload) == offsets[line_number] - offsets[line_number - 1]:
+            self.file.seek(offsets[line_number - 1] + LENGTH.size)
+            self.file.write(payload)
+            self.count('bytes_written', len(payload))
+            self.written()
+            return
+
+        lines = self.readlines()
+        lines[line_number - 1] = str(content) + '\n'
+        self.write_lines(lines)
+
+    def overwrite_line_padded(self, line_number, content=""):
+        offsets = self.backend.offsets
+        if 0 < line_number < len(offsets):
+            padding = offsets[line_number] - offsets[line_number - 1] - LENGTH.size - len(str(content).encode())
+            if padding > 0:
+                content = str(content) + " " * padding
+        self.overwrite_line(line_number, content)
+
+    def tombstone_lines(self, line_number, count):
+        offsets = self.backend.offsets
+        if not 0 < line_number <= line_number + count - 1 < len(offsets):
+            raise IndexError("Line number out of range")
+
+        for i in range(line_number - 1, line_number - 1 + count):
+            self.file.seek(offsets[i] + LENGTH.size)
+            self.file.write(TOMBSTONE.encode() * (offsets[i + 1] - offsets[i] - LENGTH.size))
+        self.count('bytes_written', offsets[line_number - 1 + count] - offsets[line_number - 1] - LENGTH.size * count)
+        self.written()
+
+    def insert_line(self, line_number, content=""):
+        lines = self.readlines()
+        lines.insert(line_number - 1, str(content) + '\n')
+        self.write_lines(lines)
+
+    def append_line(self, content=""):
+        offsets = self.backend.offsets
+        start = offsets[-1]
+        self.file.seek(offsets[-1])
+        for line in content.split('\n'):
+            payload = line.encode()
+            self.file.write(LENGTH.pack(len(payload)) + payload)
+            offsets.append(offsets[-1] + LENGTH.size + len(payload))
+        self.file.truncate()
+        self.write_header(len(offsets) - 1, 0)
+        self.count('bytes_written', offsets[-1] - start + HEADER.size)
+        self.written()
+
+    def read_line(self, line_number):
+        offsets = self.backend.offsets
+        if not 0 < line_number < len(offsets):
+            raise IndexError("Line number out of range")
+
+        self.file.seek(offsets[line_number - 1] + LENGTH.size)
+        self.count_lines(line_number - 1, line_number)
+        return self.file.read(offsets[line_number] - offsets[line_number - 1] - LENGTH.size).decode()
+
+    def read_lines(self, line_number, count):
+        return list(self.iter_lines(line_number, count))
+
+    def iter_lines(self, line_number, count):
+        offsets = self.backend.offsets
+        end = min(line_number - 1 + count, len(offsets) - 1)
+        self.file.seek(offsets[line_number - 1])
+        i = line_number - 1
+        try:
+            while i < end:
+                length, = LENGTH.unpack(self.file.read(LENGTH.size))
+                line = self.file.read(length).decode()
+                i += 1
+                yield line
+        finally:
+            self.count_lines(line_number - 1, i)
+
+    def read_bytes(self, line_number, count):
+        offsets = self.backend.offsets
+        self.count('bytes_read', offsets[line_number - 1 + count] - offsets[line_number - 1])
+        self.file.seek(offsets[line_number - 1])
+        return self.file.read(offsets[line_number - 1 + count] - offsets[line_number - 1])
+
+    def delete_line(self, line_number):
+        if not 0 < line_number < len(self.backend.offsets):
+            raise IndexError("Line number out of range")
+
+        lines = self.readlines()
+        del lines[line_number - 1]
+        self.write_lines(lines)
+
+
+class BinaryBackend:
+    name = "binary"
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.offsets = [HEADER.size]
+        self.on_write = None
+        self.metrics = None
+
+    def written(self):
+        if self.on_write is not None:
+            self.on_write()
+
+    def build_index(self):
+        with open(self.filename, "rb") as file:
+            magic, version, _, count, trailer_position = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("Not a binary database file")
+
+            if trailer_position:
+                file.seek(trailer_position)
+                self.offsets = unpack_offsets(file.read(8 * (count + 1)))
+                return
+
+            offsets = [HEADER.size]
+            for _ in range(count):
+                length, = LENGTH.unpack(file.read(LENGTH.size))
+                file.seek(length, os.SEEK_CUR)
+                offsets.append(offsets[-1] + LENGTH.size + length)
+            self.offsets = offsets
+
+    def split_records(self, data):
+        records = []
+        position = 0
+        while position < len(data):
+            length, = LENGTH.unpack_from(data, position)
+            position += LENGTH.size
+            records.append(data[position:position + length].decode())
+            position += length
+        return records
+
+    def write_records(self, file, lines):
+        file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        offsets = [HEADER.size]
+        for line in lines:
+            payload = line.rstrip('\n').encode()
+            file.write(LENGTH.pack(len(payload)) + payload)
+            offsets.append(offsets[-1] + LENGTH.size + len(payload))
+        file.write(pack_offsets(offsets))
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, 0, len(offsets) - 1, offsets[-1]))
+        return offsets
+
+    @contextmanager
+    def open(self, mode="r", use_mmap=False):
+        if use_mmap:
+            raise ValueError("mmap reads are only supported by the text backend")
+        with open(self.filename, "r+b" if mode == "r+" else "rb") as file, counted(self, BinaryFile(self, file)) as binary_file:
+            yield binary_file
+
+    def replace(self, lines):
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "wb") as file:
+            offsets = self.write_records(file, lines)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, self.filename)
+        self.offsets = offsets
+        if self.metrics is not None:
+            self.metrics.merge({'rewrites': 1, 'bytes_written': offsets[-1], 'flushes': 1, 'fsyncs': 1})
+
+
+BACKENDS = {
+    TextBackend.name: TextBackend,
+    BinaryBackend.name: BinaryBackend,
+}
+
+
+def detect_backend(filename):
+    if os.path.exists(filename):
+        with open(filename, "rb") as file:
+            if file.read(len(MAGIC)) == MAGIC:
+                return BinaryBackend.name
+    return TextBackend.name
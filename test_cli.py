@@ -1,14 +1,13 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, mock_open
 import cli
-updated: 2024-06-11 21:39:40
 
 class TestCLI(unittest.TestCase):
     @patch('cli.PromptSession')
     @patch('cli.tbm.TextDatabase')
     def test_help_command(self, MockTextDatabase, MockPromptSession):
         # Mocking the PromptSession to simulate user input
-        MockPromptSession.return_value.prompt.return_value = 'help'
+        MockPromptSession.return_value.prompt.side_effect = ['help', 'quit']
         
         with patch('builtins.print') as mocked_print:
             cli.main()
@@ -18,7 +17,7 @@ class TestCLI(unittest.TestCase):
     @patch('cli.tbm.TextDatabase')
     def test_tables_command(self, MockTextDatabase, MockPromptSession):
         # Mocking the PromptSession to simulate user input
-        MockPromptSession.return_value.prompt.return_value = 'tables'
+        MockPromptSession.return_value.prompt.side_effect = ['tables', 'quit']
         
         # Mocking the TextDatabase.list_tables method
         MockTextDatabase.return_value.list_tables.return_value = 'table1\ntable2'
@@ -38,9 +37,21 @@ class TestCLI(unittest.TestCase):
 
         with patch('builtins.print') as mocked_print:
             cli.main()
-            mock_db.add_table.assert_called_with('test', 'col1,col2')
+            mock_db.add_table.assert_called_with('test', ['col1,col2'])
             mocked_print.assert_any_call(mock_db.list_tables())
 
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_create_index_command(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['create index test.col1', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+        mock_db.check_table_exists.return_value = True
+
+        cli.main()
+        mock_db.create_column_index.assert_called_with('test', 'col1')
+
     @patch('cli.PromptSession')
     @patch('cli.tbm.TextDatabase')
     def test_view_command(self, MockTextDatabase, MockPromptSession):
@@ -49,12 +60,85 @@ class TestCLI(unittest.TestCase):
 
         mock_db = MockTextDatabase.return_value
         mock_db.check_table_exists.return_value = True
-        mock_db.view_table.return_value = 'row1\nrow2'
+        mock_db.get_table_columns.return_value = ['col1']
+        mock_db.iter_table.return_value = iter([['row1'], ['row2']])
+
+        with patch('builtins.print') as mocked_print:
+            cli.main()
+            mock_db.iter_table.assert_called_with('test', 0, None)
+            mocked_print.assert_any_call(cli.tabulate([['row1'], ['row2']], headers=['col1']))
+
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_view_limit_offset_command(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['view test limit 5 offset 10', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+        mock_db.check_table_exists.return_value = True
+        mock_db.iter_table.return_value = iter([])
+
+        cli.main()
+        mock_db.iter_table.assert_called_with('test', 10, 5)
+
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_view_order_by_command(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['view test order by col1 desc limit 5', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+        mock_db.check_table_exists.return_value = True
+        mock_db.iter_sorted.return_value = iter([])
+
+        cli.main()
+        mock_db.iter_sorted.assert_called_with('test', 'col1', True, 0, 5)
+        mock_db.iter_table.assert_not_called()
+
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_select_command(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['select col1 from test where col2 >= 5', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+        mock_db.check_table_exists.return_value = True
+        mock_db.select.return_value = iter([['row1']])
+
+        with patch('builtins.print') as mocked_print:
+            cli.main()
+            mock_db.select.assert_called_with('test', ['col1'], ('col2', '>=', 5))
+            mocked_print.assert_any_call(cli.tabulate([['row1']], headers=['col1']))
+
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_select_group_by_command(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['select count(*), col1 from test group by col1', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+        mock_db.check_table_exists.return_value = True
+        mock_db.aggregate.return_value = [['a', 2], ['b', 1]]
+
+        with patch('builtins.print') as mocked_print:
+            cli.main()
+            mock_db.aggregate.assert_called_with('test', [('count', None)], None, 'col1')
+            mocked_print.assert_any_call(cli.tabulate([[2, 'a'], [1, 'b']], headers=['count(*)', 'col1']))
+
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_select_join_command(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['select a.col1, b.col2 from a join b on b.id = a.id', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+        mock_db.check_table_exists.return_value = True
+        mock_db.join.return_value = iter([['x', 'y']])
 
         with patch('builtins.print') as mocked_print:
             cli.main()
-            mock_db.view_table.assert_called_with('test')
-            mocked_print.assert_any_call('row1\nrow2')
+            mock_db.join.assert_called_with('a', 'b', 'id', 'id', ['a.col1', 'b.col2'])
+            mocked_print.assert_any_call(cli.tabulate([['x', 'y']], headers=['a.col1', 'b.col2']))
 
     @patch('cli.PromptSession')
     @patch('cli.tbm.TextDatabase')
@@ -79,5 +163,71 @@ class TestCLI(unittest.TestCase):
         cli.main()
         mock_db.add_row_to_table.assert_called_with('test', 'row')
 
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_begin_commit_commands(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['begin', 'insert row into test', 'commit', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+        mock_db.check_table_exists.return_value = True
+
+        cli.main()
+        mock_db.begin.assert_called_once()
+        mock_db.add_row_to_table.assert_called_with('test', 'row')
+        mock_db.commit.assert_called_once()
+
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_insert_many_command(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['insert many into test from rows.txt', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+        mock_db.check_table_exists.return_value = True
+        mock_db.add_rows_to_table.side_effect = lambda table, rows: len(list(rows))
+
+        with patch('builtins.open', mock_open(read_data='row1\nrow2\n')):
+            with patch('builtins.print') as mocked_print:
+                cli.main()
+                mocked_print.assert_any_call("2 rows inserted into table 'test'.")
+
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_vacuum_command(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['vacuum', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+
+        cli.main()
+        mock_db.compact.assert_called_once()
+
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_scripted_commands(self, MockTextDatabase, MockPromptSession):
+        mock_db = MockTextDatabase.return_value
+        mock_db.list_tables.return_value = ['test']
+
+        with patch('builtins.print') as mocked_print:
+            cli.main(['data.db', '--read-only', '-c', 'tables'])
+            MockTextDatabase.assert_called_with('data.db', read_only=True)
+            MockPromptSession.assert_not_called()
+            mocked_print.assert_any_call(['test'])
+
+    @patch('cli.PromptSession')
+    @patch('cli.tbm.TextDatabase')
+    def test_stats_command(self, MockTextDatabase, MockPromptSession):
+        # Mocking the PromptSession to simulate user input
+        MockPromptSession.return_value.prompt.side_effect = ['stats', 'quit']
+
+        mock_db = MockTextDatabase.return_value
+        mock_db.stats.return_value = {'counters': {'rewrites': 2}, 'latency': {}}
+
+        with patch('builtins.print') as mocked_print:
+            cli.main()
+            mock_db.stats.assert_called_once()
+            mocked_print.assert_any_call(cli.tabulate([('rewrites', 2)], headers=["counter", "value"]))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,731 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import aggregates
+import sorting
+import storage
+import text_database_manager as tbm
+from async_database import AsyncTextDatabase
+from directory_database import DirectoryDatabase
+from wal import read_wal
+
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "test.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+class TestRoundTrip(DatabaseTestCase):
+    def test_both_backends(self):
+        rows = [[1, "a"], [2.5, "comma, quote\" and\nnewline"], [None, True], [[1, [2]], {"k": "v"}], ["~", ""]]
+        for backend in ("text", "binary"):
+            filename = f"{self.filename}.{backend}"
+            db = tbm.TextDatabase(filename, backend=backend)
+            db.add_table('t', ['a', 'b'])
+            db.add_rows_to_table('t', rows)
+            db.delete_row_from_table('t', [None, True])
+            db.close()
+
+            db = tbm.TextDatabase(filename)
+            self.assertEqual(db.storage.name, backend)
+            self.assertEqual(db.get_table_columns('t'), ['a', 'b'])
+            self.assertEqual(list(db.iter_table('t')), [row for row in rows if row != [None, True]])
+            db.close()
+
+    def test_rows_that_dont_read_back_are_refused(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['a'])
+        db.add_row_to_table('t', [(1, 2)])
+        for row in ([float('nan')], [float('inf')], "[NaN]", [object()]):
+            self.assertRaises(ValueError, db.add_row_to_table, 't', row)
+        self.assertRaises(ValueError, db.add_rows_to_table, 't', [[1], [float('nan')]])
+        self.assertEqual(db.view_table('t'), [['a'], [(1, 2)]])
+        db.close()
+
+
+class TestDelete(DatabaseTestCase):
+    def test_old_and_new_spellings_in_one_pass(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['n', 's'])
+        db.add_rows_to_table('t', [[2, "b"], [1, "a"], [2, "b"]])
+        db.close()
+        # The first row as the Python literal rows were written with before the JSON codec, same length
+        with open(self.filename) as file:
+            text = file.read()
+        with open(self.filename, "w") as file:
+            file.write(text.replace('[2, "b"]', "[2, 'b']", 1))
+
+        db = tbm.TextDatabase(self.filename)
+        self.assertTrue(db.check_row_exists('t', [2, "b"]))
+        db.metrics.reset()
+        self.assertEqual(db.delete_row_from_table('t', [2, "b"]), 2)
+        # Both spellings are matched in a single read of the three rows
+        self.assertLess(db.stats()['counters']['line_reads'], 2 * 3)
+        self.assertEqual(list(db.iter_table('t')), [[1, "a"]])
+        self.assertFalse(db.check_row_exists('t', (2, "b")))
+        db.close()
+
+
+class TestStatistics(DatabaseTestCase):
+    def header_stats(self, db, table_name):
+        # Read back from the file itself, not from anything the instance has cached
+        with open(self.filename) as file:
+            lines = file.read().split('\n')
+        with db.open_file() as file:
+            table_line = db.get_table_line_from_meta(file, table_name)
+        return aggregates.parse_rows_line(lines[table_line + 4])
+
+    def test_after_deletes_and_compact(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['n', 's'])
+        db.add_rows_to_table('t', [[5, "m"], [1, "a"], [9, "z"], [None, "b"], [2.5, None], ["x", "q"]])
+        num_rows, stats = self.header_stats(db, 't')
+        self.assertEqual(num_rows, 6)
+        self.assertEqual(stats["count"], 6)
+        self.assertEqual(stats["columns"][0], {"count": 5, "numbers": 4, "sum": 17.5, "min": 1, "max": "x"})
+        self.assertEqual(stats["columns"][1], {"count": 5, "numbers": 0, "sum": 0, "min": "a", "max": "z"})
+
+        # A delete inside the bounds keeps them, one at a bound drops it until a full pass
+        db.delete_row_from_table('t', [5, "m"])
+        num_rows, stats = self.header_stats(db, 't')
+        self.assertEqual((num_rows, stats["count"]), (6, 5))
+        self.assertEqual(stats["columns"][0], {"count": 4, "numbers": 3, "sum": 12.5, "min": 1, "max": "x"})
+        db.delete_row_from_table('t', [1, "a"])
+        db.delete_row_from_table('t', [9, "z"])
+        num_rows, stats = self.header_stats(db, 't')
+        self.assertEqual((num_rows, stats["count"]), (6, 3))
+        self.assertEqual(stats["columns"][0], {"count": 2, "numbers": 1, "sum": 2.5, "max": "x"})
+        self.assertEqual(stats["columns"][1], {"count": 2, "numbers": 0, "sum": 0})
+        self.assertEqual(db.aggregate('t', [("count", None), ("min", "n"), ("max", "s"), ("sum", "n")]), [[3, 2.5, "q", 2.5]])
+
+        db.compact()
+        num_rows, stats = self.header_stats(db, 't')
+        self.assertEqual((num_rows, stats["count"]), (3, 3))
+        self.assertEqual(stats["columns"][0], {"count": 2, "numbers": 1, "sum": 2.5, "min": 2.5, "max": "x"})
+        self.assertEqual(stats["columns"][1], {"count": 2, "numbers": 0, "sum": 0, "min": "b", "max": "q"})
+
+        # Deleting every row resets the columns
+        for row in list(db.iter_table('t')):
+            db.delete_row_from_table('t', row)
+        num_rows, stats = self.header_stats(db, 't')
+        self.assertEqual(stats, {"count": 0, "columns": [aggregates.new_column(), aggregates.new_column()]})
+        self.assertEqual(db.aggregate('t', [("count", None), ("max", "n")]), [[0, None]])
+        db.close()
+
+
+class TestMetrics(DatabaseTestCase):
+    def test_writes_are_counted_and_timed(self):
+        calls = []
+        db = tbm.TextDatabase(self.filename, metrics_hook=lambda operation, seconds: calls.append((operation, seconds)))
+        db.add_table('t', ['n'])
+        db.metrics.reset()
+        del calls[:]
+
+        # Appending rows rewrites the whole file once
+        db.add_rows_to_table('t', [[1], [2], [3]])
+        counters = db.stats()['counters']
+        self.assertEqual(counters['rewrites'], 1)
+        self.assertEqual(counters['bytes_written'], os.path.getsize(self.filename))
+        self.assertEqual(calls[-1][0], 'add_rows_to_table')
+        self.assertIsInstance(calls[-1][1], float)
+        self.assertGreaterEqual(calls[-1][1], 0)
+
+        # A delete tombstones in place: more bytes written, no rewrite
+        db.delete_row_from_table('t', [2])
+        counters = db.stats()['counters']
+        self.assertEqual(counters['rewrites'], 1)
+        self.assertGreater(counters['bytes_written'], os.path.getsize(self.filename))
+        self.assertEqual(calls[-1][0], 'delete_row_from_table')
+        latency = db.stats()['latency']
+        self.assertEqual(latency['add_rows_to_table']['count'], 1)
+        self.assertEqual(latency['delete_row_from_table']['count'], 1)
+        self.assertEqual(sorted(operation for operation, seconds in calls), sorted(
+            operation for operation, summary in latency.items() for i in range(summary['count'])))
+        db.close()
+
+
+class TestReadOnly(DatabaseTestCase):
+    def directory_state(self):
+        return {name: (os.path.getmtime(os.path.join(self.directory.name, name)), open(os.path.join(self.directory.name, name), "rb").read())
+                for name in os.listdir(self.directory.name)}
+
+    def test_never_writes(self):
+        self.assertRaises(FileNotFoundError, tbm.TextDatabase, self.filename, read_only=True)
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['n'])
+        db.add_rows_to_table('t', [[1], [2]])
+        db.create_column_index('t', 'n')
+        db.add_row_to_table('t', [5])
+        db.close()
+        # A stale index and a pending append-only log, both of which a writable open would fix up
+        appender = tbm.TextDatabase(self.filename, append_only=True)
+        appender.add_row_to_table('t', [3])
+        appender.close()
+        os.remove(self.filename + ".lock")
+        before = self.directory_state()
+        time.sleep(0.01)
+
+        reader = tbm.TextDatabase(self.filename, read_only=True)
+        self.assertEqual(reader.list_tables(), ['t'])
+        self.assertEqual(list(reader.iter_table('t')), [[1], [2], [5]])
+        self.assertEqual(reader.find_by_column('t', 'n', 5), [[5]])
+        self.assertEqual(list(reader.iter_sorted('t', 'n', descending=True)), [[5], [2], [1]])
+        self.assertEqual(reader.aggregate('t', [("sum", "n")]), [[8]])
+        with tempfile.TemporaryDirectory() as directory:
+            reader.export(os.path.join(directory, "export.db"))
+
+        writes = [
+            (reader.add_table, 'u', ['x']), (reader.delete_table, 't'), (reader.add_row_to_table, 't', [4]),
+            (reader.add_rows_to_table, 't', [[4]]), (reader.delete_row_from_table, 't', [1]), (reader.compact,),
+            (reader.migrate,), (reader.begin,), (reader.create_column_index, 't', 'n'), (reader.drop_column_index, 't', 'n'),
+        ]
+        for write, *args in writes:
+            self.assertRaises(RuntimeError, write, *args)
+        reader.close()
+        self.assertEqual(self.directory_state(), before)
+
+    def test_directory_database(self):
+        path = os.path.join(self.directory.name, "db")
+        with DirectoryDatabase(path) as db:
+            db.add_table('t', ['n'])
+            db.add_row_to_table('t', [1])
+        reader = DirectoryDatabase(path, read_only=True)
+        self.assertEqual(list(reader.iter_table('t')), [[1]])
+        for write, *args in ((reader.add_table, 'u'), (reader.delete_table, 't'), (reader.add_row_to_table, 't', [2]),
+                             (reader.compact,), (reader.begin,)):
+            self.assertRaises(RuntimeError, write, *args)
+        reader.close()
+        self.assertRaises(FileNotFoundError, DirectoryDatabase, os.path.join(self.directory.name, "missing"), read_only=True)
+
+
+class TestCompact(DatabaseTestCase):
+    def test_written_file(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('a', ['n'])
+        db.add_table('gone', ['x'])
+        db.add_table('b', ['s'])
+        db.add_rows_to_table('a', [[1], [2], [3]])
+        db.add_rows_to_table('b', [["x"]])
+        db.add_rows_to_table('gone', [[9]])
+        db.delete_row_from_table('a', [2])
+        db.delete_table('gone')
+        db.compact()
+
+        with open(self.filename, "rb") as file:
+            lines = file.read().decode().split('\n')[:-1]
+        stamps = {number: lines[number - 1] for number in (3, 4, 9, 10, 18, 19)}
+        stats_a = '{"count": 2, "columns": [{"count": 2, "numbers": 2, "sum": 4, "min": 1, "max": 3}]}'
+        stats_b = '{"count": 1, "columns": [{"count": 1, "numbers": 0, "sum": 0, "min": "x", "max": "x"}]}'
+        # "lines:" holds the number the next line would get, like a new file's header does
+        expected = [
+            'META', 'lines: 23', stamps[3], stamps[4], 'tables: [[7, "a"], [16, "b"]]',
+            '', 'TABLE', 'name: a', stamps[9], stamps[10], 'columns: ["n"]', 'rows: 2 ' + stats_a + ' ' * 16, '[1]', '[3]',
+            '', 'TABLE', 'name: b', stamps[18], stamps[19], 'columns: ["s"]', 'rows: 1 ' + stats_b + ' ' * 16, '["x"]',
+        ]
+        self.assertEqual(lines, expected)
+        self.assertTrue(all(stamps[number].startswith(("created: ", "updated: ")) for number in stamps))
+        self.assertFalse([line for line in lines if storage.is_tombstone(line)])
+
+        # The offsets kept for the new file point at the start of every line
+        offsets = [0]
+        for line in lines:
+            offsets.append(offsets[-1] + len(line.encode()) + 1)
+        self.assertEqual(db.storage.offsets, offsets)
+        self.assertEqual(db.view_table('a'), [['n'], [1], [3]])
+        db.add_row_to_table('a', [4])
+        self.assertEqual(db.view_table('a'), [['n'], [1], [3], [4]])
+        self.assertEqual(db.view_table('b'), [['s'], ["x"]])
+        db.close()
+
+
+class TestHashIndex(DatabaseTestCase):
+    def assertIndexMatchesFile(self, db, table_name):
+        # The index kept up to date in place has to equal one built from scratch
+        fresh = tbm.TextDatabase(self.filename, read_only=True)
+        fresh.create_hash_index(table_name)
+        with fresh.open_file() as file:
+            expected = fresh.get_hash_index(file, table_name, fresh.get_table_line_from_meta(file, table_name))
+        fresh.close()
+        with db.open_file() as file:
+            self.assertEqual(db.get_hash_index(file, table_name, db.get_table_line_from_meta(file, table_name)), expected)
+
+    def test_maintained_across_writes(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['n', 's'])
+        db.add_rows_to_table('t', [[1, "a"], [2, "b"], [1, "a"]])
+        db.create_hash_index('t')
+        self.assertTrue(db.check_row_exists('t', [1, "a"]))
+        self.assertIsNotNone(db.hash_indexes['t'])
+
+        db.add_rows_to_table('t', [[3, "c"], [1, "a"]])
+        self.assertIndexMatchesFile(db, 't')
+        self.assertEqual(db.delete_row_from_table('t', [1, "a"]), 3)
+        self.assertFalse(db.check_row_exists('t', [1, "a"]))
+        self.assertEqual(db.delete_row_from_table('t', [1, "a"]), 0)
+        self.assertIndexMatchesFile(db, 't')
+
+        db.begin()
+        db.add_row_to_table('t', [4, "d"])
+        db.delete_row_from_table('t', [2, "b"])
+        self.assertTrue(db.check_row_exists('t', [4, "d"]))
+        self.assertFalse(db.check_row_exists('t', [2, "b"]))
+        db.rollback()
+        self.assertFalse(db.check_row_exists('t', [4, "d"]))
+        self.assertTrue(db.check_row_exists('t', [2, "b"]))
+        self.assertIndexMatchesFile(db, 't')
+
+        with db.batch():
+            db.add_row_to_table('t', [5, "e"])
+        self.assertTrue(db.check_row_exists('t', [5, "e"]))
+        self.assertIndexMatchesFile(db, 't')
+
+        db.compact()
+        self.assertEqual(db.delete_row_from_table('t', [3, "c"]), 1)
+        self.assertEqual(list(db.iter_table('t')), [[2, "b"], [5, "e"]])
+        self.assertIndexMatchesFile(db, 't')
+        db.close()
+
+
+class TestCatalogCache(DatabaseTestCase):
+    def test_sees_writes_by_other_instances(self):
+        reader = tbm.TextDatabase(self.filename)
+        writer = tbm.TextDatabase(self.filename)
+        self.assertEqual(reader.list_tables(), [])
+
+        writer.add_table('a', ['n'])
+        writer.add_table('b', ['s'])
+        self.assertEqual(reader.list_tables(), ['a', 'b'])
+        writer.add_rows_to_table('a', [[1], [2]])
+        self.assertEqual(list(reader.iter_table('a')), [[1], [2]])
+
+        # Deleting a table moves the line numbers of every table after it
+        writer.delete_table('a')
+        writer.add_rows_to_table('b', [["x"]])
+        self.assertEqual(reader.list_tables(), ['b'])
+        self.assertEqual(reader.get_table_columns('b'), ['s'])
+        self.assertEqual(list(reader.iter_table('b')), [["x"]])
+        writer.close()
+
+        # And from another process, whose compact() replaces the file
+        code = ("import text_database_manager as tbm\n"
+                f"db = tbm.TextDatabase({self.filename!r})\n"
+                "db.add_table('c', ['n'])\n"
+                "db.add_rows_to_table('c', [[3]])\n"
+                "db.compact()\n"
+                "db.close()\n")
+        subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        self.assertEqual(reader.list_tables(), ['b', 'c'])
+        self.assertEqual(list(reader.iter_table('c')), [[3]])
+        self.assertEqual(list(reader.iter_table('b')), [["x"]])
+        reader.close()
+
+
+class TestMmap(DatabaseTestCase):
+    def test_reads_match_normal_reads(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('a', ['n', 's'])
+        db.add_table('b', ['s'])
+        db.add_rows_to_table('a', [[i, "é" * (i % 5) + "ü"] for i in range(3000)])
+        db.add_rows_to_table('b', [["naïve"], ["x"]])
+        for i in range(0, 3000, 7):
+            db.delete_row_from_table('a', [i, "é" * (i % 5) + "ü"])
+
+        mapped = tbm.TextDatabase(self.filename, use_mmap=True)
+        for reader in (db, mapped):
+            reader.block_cache.clear()
+        for table_name in ('a', 'b'):
+            self.assertEqual(mapped.view_table(table_name), db.view_table(table_name))
+        self.assertEqual(list(mapped.iter_table('a', 1500, 40)), list(db.iter_table('a', 1500, 40)))
+        self.assertEqual(list(mapped.select('a', ['s'], ('n', '>', 2990))), list(db.select('a', ['s'], ('n', '>', 2990))))
+        self.assertEqual(list(mapped.iter_sorted('a', 's', limit=10)), list(db.iter_sorted('a', 's', limit=10)))
+        self.assertEqual(mapped.aggregate('a', [("count", None), ("max", "n")]), db.aggregate('a', [("count", None), ("max", "n")]))
+
+        # Writes go through the normal file, the mapped reads pick them up
+        mapped.add_row_to_table('b', ["ñ"])
+        self.assertEqual(list(mapped.iter_table('b')), [["naïve"], ["x"], ["ñ"]])
+        self.assertEqual(list(db.iter_table('b')), [["naïve"], ["x"], ["ñ"]])
+        mapped.close()
+        db.close()
+
+    def test_binary_backend_refuses_mmap(self):
+        db = tbm.TextDatabase(self.filename, backend="binary", use_mmap=True)
+        self.assertRaises(ValueError, db.list_tables)
+        db.close()
+
+
+class TestAppendOnly(DatabaseTestCase):
+    def test_reconcile(self):
+        writer = tbm.TextDatabase(self.filename, append_only=True)
+        writer.add_table('a', ['n'])
+        writer.add_table('gone', ['n'])
+        writer.add_rows_to_table('a', [[1], [2]])
+        writer.add_row_to_table('gone', [1])
+        writer.add_row_to_table('a', [3])
+        with open(self.filename) as file:
+            self.assertNotIn('[3]', file.read())
+        self.assertTrue(os.path.exists(self.filename + ".log"))
+
+        # Deleting the table folds its logged rows in first, a new table of the same name starts empty
+        db = tbm.TextDatabase(self.filename)
+        db.delete_table('gone')
+        db.add_table('gone', ['n'])
+        self.assertFalse(os.path.exists(self.filename + ".log"))
+        self.assertEqual(list(db.iter_table('gone')), [])
+
+        # A record left behind for a table that no longer exists is dropped
+        writer.add_row_to_table('a', [4])
+        with open(self.filename + ".log", "a") as log:
+            log.write('["missing", "[1]"]\n')
+        self.assertEqual(db.view_table('a'), [['n'], [1], [2], [3], [4]])
+        self.assertEqual(db.list_tables(), ['a', 'gone'])
+        self.assertFalse(os.path.exists(self.filename + ".log"))
+        writer.close()
+        db.close()
+
+
+class TestConcurrency(DatabaseTestCase):
+    def test_two_process_writes(self):
+        with tbm.TextDatabase(self.filename) as db:
+            db.add_table('t', ['worker', 'n'])
+        code = ("import sys, text_database_manager as tbm\n"
+                f"db = tbm.TextDatabase({self.filename!r})\n"
+                "worker = int(sys.argv[1])\n"
+                "for n in range(100):\n"
+                "    db.add_row_to_table('t', [worker, n])\n"
+                "    if n % 2:\n"
+                "        db.delete_row_from_table('t', [worker, n - 1])\n"
+                "db.close()\n")
+        # Both writers rewrite the same file at once, without the lock some of their changes get lost
+        workers = [subprocess.Popen([sys.executable, "-c", code, str(worker)], cwd=os.path.dirname(os.path.abspath(__file__)))
+                   for worker in range(2)]
+        for worker in workers:
+            self.assertEqual(worker.wait(60), 0)
+
+        db = tbm.TextDatabase(self.filename)
+        rows = list(db.iter_table('t'))
+        self.assertEqual(sorted(rows), [[worker, n] for worker in range(2) for n in range(1, 100, 2)])
+        self.assertEqual(db.aggregate('t', [("count", None)])[0][0], 100)
+        db.close()
+
+
+class TestSnapshot(DatabaseTestCase):
+    def test_isolation(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['a'])
+        db.add_rows_to_table('t', [[1], [2], [3]])
+        db.create_column_index('t', 'a')
+
+        with db.snapshot() as snapshot:
+            db.add_row_to_table('t', [4])
+            db.delete_row_from_table('t', [1])
+            db.add_table('u', ['b'])
+            db.compact()
+            self.assertEqual(snapshot.list_tables(), ['t'])
+            self.assertEqual(list(snapshot.iter_table('t')), [[1], [2], [3]])
+            self.assertEqual(snapshot.find_by_column('t', 'a', 1), [[1]])
+        self.assertEqual(list(db.iter_table('t')), [[2], [3], [4]])
+        self.assertFalse(os.path.exists(snapshot.filename))
+        db.close()
+
+    def test_copy_runs_without_the_lock(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['n'])
+        db.add_rows_to_table('t', [[1], [2]])
+        copies = []
+
+        def clone_file(source, target):
+            storage.clone_file(source, target)
+            copies.append(target)
+            if len(copies) == 1:
+                # A writer in another thread gets in while the first copy is made, and that copy is redone
+                writer = threading.Thread(target=db.add_row_to_table, args=('t', [3]))
+                writer.start()
+                writer.join(10)
+                self.assertFalse(writer.is_alive())
+
+        with mock.patch.object(tbm, "clone_file", clone_file):
+            snapshot = db.snapshot()
+        self.assertEqual(len(copies), 2)
+        self.assertEqual(list(snapshot.iter_table('t')), [[1], [2], [3]])
+        snapshot.close()
+        db.close()
+
+
+class TestColumnIndex(DatabaseTestCase):
+    def test_concurrent_rebuilds_of_a_stale_index(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table("t", ["a"])
+        db.add_rows_to_table("t", [[i] for i in range(2000)])
+        db.create_column_index("t", "a")
+        db.add_row_to_table("t", [5])
+
+        # Every reader finds the index stale and rewrites it at the same time
+        readers = [tbm.TextDatabase(self.filename) for _ in range(4)]
+        errors = []
+
+        def query(reader):
+            try:
+                self.assertEqual(reader.find_by_column("t", "a", 5), [[5], [5]])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=query, args=(reader,)) for reader in readers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertFalse([name for name in os.listdir(self.directory.name) if name.endswith(".tmp")])
+        for reader in readers + [db]:
+            reader.close()
+
+
+class TestWriteAheadLog(DatabaseTestCase):
+    def crash(self, script):
+        # Runs the writes in a child that dies without closing, so nothing is checkpointed
+        code = f"import os, text_database_manager as tbm\ndb = tbm.TextDatabase({self.filename!r}, wal='always')\n{script}\nos._exit(0)\n"
+        subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+    def test_replay_after_crash(self):
+        self.crash("db.add_table('t', ['a', 'b'])\n"
+                   "db.add_rows_to_table('t', [[1, 'x'], [2, 'y'], (3, 'z')])\n"
+                   "db.delete_row_from_table('t', (3, 'z'))\n"
+                   "db.delete_row_from_table('t', [1, 'x'])")
+        self.assertTrue(os.path.exists(self.filename + ".wal"))
+
+        # Reopening in a later second used to rewrite the updated: line before recovery and lose the log
+        time.sleep(1.05 - time.time() % 1)
+        db = tbm.TextDatabase(self.filename)
+        self.assertEqual(db.list_tables(), ['t'])
+        self.assertEqual(list(db.iter_table('t')), [[2, 'y']])
+        self.assertFalse(os.path.exists(self.filename + ".wal"))
+        db.close()
+
+    def test_replay_matches_live_state(self):
+        db = tbm.TextDatabase(self.filename, wal='always')
+        db.add_table('t', ['a'])
+        db.add_rows_to_table('t', [(1,), [2], (1,)])
+        db.delete_row_from_table('t', (1,))
+        live = list(db.iter_table('t'))
+        db.wal.sync()
+
+        # Replaying the log on the file as it was when the WAL started has to give the same rows
+        replayed = tbm.TextDatabase(self.filename + ".copy")
+        replayed.replaying = True
+        for operation, *args in read_wal(self.filename + ".wal")[1]:
+            getattr(replayed, operation)(*args)
+        self.assertEqual(list(replayed.iter_table('t')), live)
+        replayed.close()
+        db.close()
+
+    def test_concurrent_writers_share_fsyncs(self):
+        db = tbm.TextDatabase(self.filename, wal='always')
+        db.add_table('t', ['worker', 'n'])
+
+        def insert(worker):
+            for n in range(25):
+                db.add_row_to_table('t', [worker, n])
+
+        threads = [threading.Thread(target=insert, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Each writer waits for its fsync after releasing the lock, so the ones that queued up meanwhile share it
+        self.assertLess(db.stats()['counters']['wal_fsyncs'], 201)
+        self.assertEqual(len(list(db.iter_table('t'))), 200)
+        db.close()
+
+
+class TestAsyncDatabase(DatabaseTestCase):
+    def test_write_while_iterating(self):
+        async def run():
+            async with AsyncTextDatabase(self.filename, max_workers=1, page_size=2) as db:
+                await db.add_table('t', ['a'])
+                await db.add_rows_to_table('t', [[i] for i in range(10)])
+                seen = []
+                async for row in db.iter_table('t'):
+                    seen.append(row)
+                    if row == [3]:
+                        # Used to wait forever on the read lock held by the paused producer
+                        await asyncio.wait_for(db.add_row_to_table('t', [99]), 5)
+                # Pages are read from the live table, so the appended row turns up at the end
+                self.assertEqual(seen, [[i] for i in range(10)] + [[99]])
+                self.assertEqual([row async for row in db.iter_table('t', 3, 4)], [[3], [4], [5], [6]])
+                self.assertEqual([row async for row in db.iter_table('t', 9, 0)], [])
+                self.assertEqual(await db.view_table('t'), [['a']] + [[i] for i in range(10)] + [[99]])
+        asyncio.run(run())
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["test.db", "test.db.lock"])
+
+
+class TestScan(DatabaseTestCase):
+    def test_unpicklable_predicate(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['a'])
+        db.add_rows_to_table('t', [[i] for i in range(100)])
+        result = []
+
+        # A lambda can't reach the worker processes, the scan used to hang with the read lock held
+        scan = threading.Thread(target=lambda: result.extend(db.scan('t', lambda row: row[0] % 10 == 0, chunk_rows=10)),
+                                daemon=True)
+        scan.start()
+        scan.join(30)
+        self.assertFalse(scan.is_alive())
+        self.assertEqual(result, [[i] for i in range(0, 100, 10)])
+        db.add_row_to_table('t', [100])
+        db.close()
+
+
+class TestIterTable(DatabaseTestCase):
+    def test_start_and_limit_across_blocks(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['a'])
+        db.add_rows_to_table('t', [[i] for i in range(3 * tbm.CACHE_BLOCK_ROWS)])
+        # Tombstones in the skipped blocks move every later row's position
+        for i in list(range(0, tbm.CACHE_BLOCK_ROWS, 3)) + [tbm.CACHE_BLOCK_ROWS + 1]:
+            db.delete_row_from_table('t', [i])
+        live = list(db.iter_table('t'))
+
+        for cached in (False, True):
+            db.block_cache.clear()
+            if cached:
+                list(db.iter_table('t'))
+            for start, limit in ((0, 5), (680, 3), (682, 10), (1500, None), (2 * tbm.CACHE_BLOCK_ROWS, 2),
+                                 (len(live) - 1, 5), (len(live), 1)):
+                stop = None if limit is None else start + limit
+                self.assertEqual(list(db.iter_table('t', start, limit)), live[start:stop], (cached, start, limit))
+        db.close()
+
+
+class TestIterSorted(DatabaseTestCase):
+    def test_descending_ties_keep_insertion_order(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('t', ['key', 'n'])
+        rows = [[i % 4, i] for i in range(40)]
+        db.add_rows_to_table('t', rows)
+        expected = sorted(rows, key=lambda row: row[0], reverse=True)
+
+        for indexed in (False, True):
+            if indexed:
+                db.create_column_index('t', 'key')
+                with db.open_file() as file:
+                    table_line = db.get_table_line_from_meta(file, 't')
+                    self.assertIsNotNone(db.sorted_positions(file, 't', table_line, 'key'))
+            self.assertEqual(list(db.iter_sorted('t', 'key', descending=True)), expected, indexed)
+            self.assertEqual(list(db.iter_sorted('t', 'key', descending=True, start=8, limit=5)), expected[8:13], indexed)
+        db.close()
+
+    def test_spilled_sort(self):
+        sort_dir = os.path.join(self.directory.name, "sort")
+        os.mkdir(sort_dir)
+        db = tbm.TextDatabase(self.filename, sort_memory=1000, sort_dir=sort_dir)
+        db.add_table('t', ['key', 'n'])
+        rows = [[(i * 7919) % 500, i] for i in range(2000)]
+        db.add_rows_to_table('t', rows)
+
+        # Spills more runs than one merge can take, so some of them are merged down before the final merge
+        lines = [tbm.encode_row(row) for row in rows]
+        self.assertGreater(sum(map(sys.getsizeof, lines)), 1000 * sorting.MERGE_FANIN)
+        runs = sorting.sort_runs(lines, len, memory_limit=1000, temp_dir=sort_dir)
+        self.assertTrue(1 < len(runs) <= sorting.MERGE_FANIN)
+        sorting.close_runs(runs)
+
+        for descending in (False, True):
+            expected = sorted(rows, key=lambda row: row[0], reverse=descending)
+            self.assertEqual(list(db.iter_sorted('t', 'key', descending)), expected)
+        self.assertEqual(os.listdir(sort_dir), [])
+        db.close()
+
+
+class TestJoin(DatabaseTestCase):
+    def test_with_and_without_index(self):
+        db = tbm.TextDatabase(self.filename)
+        db.add_table('users', ['id', 'name'])
+        db.add_table('orders', ['user', 'item'])
+        users = [[i, f"user{i}"] for i in range(20)]
+        orders = [[i % 25, f"item{i}"] for i in range(100)] + [[None, "nobody"]]
+        db.add_rows_to_table('users', users)
+        db.add_rows_to_table('orders', orders)
+        expected = sorted([user[1], order[1]] for user in users for order in orders if user[0] == order[0])
+
+        for indexed in (False, True):
+            if indexed:
+                db.create_column_index('orders', 'user')
+                db.create_column_index('users', 'id')
+            rows = db.join('users', 'orders', 'id', 'user', ['users.name', 'item'])
+            self.assertEqual(sorted(rows), expected, indexed)
+        db.close()
+
+
+class TestDirectoryDatabase(DatabaseTestCase):
+    def test_batch_rollback(self):
+        path = os.path.join(self.directory.name, "db")
+        db = DirectoryDatabase(path)
+        db.add_table('a', ['x'])
+        db.add_table('b', ['y'])
+        db.add_rows_to_table('a', [[1], [2]])
+
+        db.begin()
+        db.add_row_to_table('a', [3])
+        db.delete_row_from_table('a', [1])
+        db.add_row_to_table('b', ['new'])
+        # Catalog changes would survive the rollback, so they're refused
+        self.assertRaises(RuntimeError, db.delete_table, 'a')
+        self.assertRaises(RuntimeError, db.add_table, 'c', ['z'])
+        db.rollback()
+
+        reopened = DirectoryDatabase(path)
+        self.assertEqual(reopened.list_tables(), ['a', 'b'])
+        self.assertEqual(list(reopened.iter_table('a')), [[1], [2]])
+        self.assertEqual(list(reopened.iter_table('b')), [])
+        reopened.close()
+
+        with db.batch():
+            db.add_row_to_table('b', ['kept'])
+        self.assertEqual(list(db.iter_table('b')), [['kept']])
+        db.delete_table('a')
+        self.assertEqual(db.list_tables(), ['b'])
+        db.close()
+
+    def test_snapshot_and_export(self):
+        db = DirectoryDatabase(os.path.join(self.directory.name, "db"))
+        db.add_table('a', ['x'])
+        db.add_rows_to_table('a', [[1], [2]])
+        db.create_column_index('a', 'x')
+        db.add_table('b', ['y'])
+
+        snapshot = db.snapshot()
+        db.add_row_to_table('a', [3])
+        db.delete_table('b')
+        db.add_table('c', ['z'])
+        self.assertEqual(snapshot.list_tables(), ['a', 'b'])
+        self.assertEqual(list(snapshot.iter_table('a')), [[1], [2]])
+        self.assertEqual(snapshot.find_by_column('a', 'x', 2), [[2]])
+        self.assertRaises(RuntimeError, snapshot.add_row_to_table, 'a', [4])
+        snapshot.close()
+        self.assertFalse(os.path.exists(snapshot.path))
+
+        exported = os.path.join(self.directory.name, "exported")
+        db.export(exported, backend="binary")
+        copy = DirectoryDatabase(exported)
+        self.assertEqual(copy.list_tables(), ['a', 'c'])
+        self.assertEqual(list(copy.iter_table('a')), [[1], [2], [3]])
+        self.assertEqual(copy.table('a').storage.name, "binary")
+        copy.close()
+        db.close()
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["db", "exported"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,112 +1,429 @@
 import json
 import os
+import pickle
 import time
 from io import TextIOWrapper
 import sys
-import ast
+import tempfile
+import threading
+import zlib
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from itertools import chain, islice
+
+from aggregates import Aggregation, add_row, format_rows_line, is_exact, new_stats, parse_rows_line, remove_row
+from cache import LRUCache
+from codec import column_value, decode_row, encode_row, encode_value, sort_key
+from joins import hash_join, join_projection, joined_rows, lookup_join
+from locking import DatabaseLock
+from metrics import Metrics, timed
+from query import Condition
+from sorting import SORT_MEMORY, merge_runs, reverse_sorted, sort_runs, top_n
+from storage import BACKENDS, LineBuffer, TOMBSTONE, clone_file, detect_backend, is_tombstone
+from wal import WriteAheadLog, read_wal
 
 LN_LINES = 2
 LN_CREATED = 3
 LN_UPDATED = 4
 LN_TABLES = 5
 
+SCAN_CHUNK_ROWS = 10000
+CACHE_BLOCK_ROWS = 1024
+STATS_PADDING = 16
+CLONE_ATTEMPTS = 3
+
+WAL_OPERATIONS = {"add_table", "add_rows_to_table", "delete_row_from_table", "delete_table"}
+
+
+def is_picklable(value):
+    # Lambdas and local functions can't be sent to a worker process, the pool would hang on them
+    try:
+        pickle.dumps(value)
+        return True
+    except Exception:
+        return False
+
+
+def scan_chunk(backend_name, filename, start, end, predicate):
+    with open(filename, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    matches_line = getattr(predicate, "matches_line", None)
+    rows = (decode_row(row) for row in BACKENDS[backend_name](filename).split_records(data)
+            if not is_tombstone(row) and (matches_line is None or matches_line(row)))
+    return [row for row in rows if predicate is None or predicate(row)]
+
+
 class TextDatabase:
-    def __init__(self, filename):
+    def __init__(self, filename, append_only=False, use_mmap=False, backend=None,
+                 wal=None, wal_interval=0.05, checkpoint_every=1000, cache_blocks=64, metrics_hook=None,
+                 read_only=False, sort_memory=SORT_MEMORY, sort_dir=None, metrics=None):
+        if wal is not None and append_only:
+            raise ValueError("WAL mode and append-only mode cannot be combined")
+        if read_only and (wal is not None or append_only):
+            raise ValueError("Read-only mode cannot be combined with WAL or append-only mode")
+        if read_only and not os.path.exists(filename):
+            raise FileNotFoundError(f"Database file not found: {filename}")
         self.filename = filename
-        if not os.path.exists(filename):
-            self.create_file()
-        self.update_meta()
+        self.log_filename = filename + ".log"
+        self.wal_filename = filename + ".wal"
+        self.append_only = append_only
+        self.read_only = read_only
+        self.use_mmap = use_mmap
+        self.sort_memory = sort_memory
+        self.sort_dir = sort_dir
+        self.metrics = Metrics(metrics_hook) if metrics is None else metrics
+        if backend is None or isinstance(backend, str):
+            backend = BACKENDS[backend or detect_backend(filename)](filename)
+        self.storage = backend
+        self.storage.on_write = self.written
+        self.storage.metrics = self.metrics
+        self.buffer = None
+        self.stat = None
+        self.tables_cache = None
+        self.rows_cache = {}
+        self.block_counts = {}
+        self.block_cache = LRUCache(cache_blocks)
+        self.hash_indexes = {}
+        self.column_indexes = {}
+        self.wal = None
+        self.wal_ops = 0
+        self.replaying = False
+        self.checkpoint_every = checkpoint_every
+        self.lock = DatabaseLock(filename + ".lock", create=not read_only)
+        self.index_lock = threading.Lock()
+        if read_only:
+            # Nothing is written and the line index is built by the first read
+            return
+        with self.lock.exclusive():
+            if not os.path.exists(filename):
+                self.create_file()
+            self.build_index()
+            # The WAL is matched against the file as it was at the crash, so replay it before touching anything
+            self.recover()
+            self.update_meta()
+        if wal is not None:
+            self.lock.pin()
+            self.wal = WriteAheadLog(self.wal_filename, wal, wal_interval, self.metrics)
+            self.start_wal()
 
     def create_file(self):
         try:
-            with open(self.filename, "a") as f:
-                content = {
-                    'lines': 6,
-                    'created': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-                    'updated': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-                    'tables': [],
-                }
-                f.write("META\n")
-                for key, val in content.items():
-                    f.write(f'{key}: {val}\n')
+            content = {
+                'lines': 6,
+                'created': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+                'updated': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+                'tables': [],
+            }
+            self.storage.replace(["META\n"] + [f'{key}: {val}\n' for key, val in content.items()])
         except Exception as e:
             print(f"Error creating file: {e}")
 
+    def stat_key(self):
+        st = os.stat(self.filename)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def validate(self):
+        with self.index_lock:
+            if self.stat_key() != self.stat:
+                self.build_index()
+
+    def written(self):
+        self.stat = self.stat_key()
+        self.tables_cache = None
+        self.rows_cache = {}
+        self.block_counts = {}
+        self.block_cache.clear()
+
+    @timed
+    def build_index(self):
+        self.written()
+        self.invalidate_hash_indexes()
+        self.storage.build_index()
+
+    def check_writable(self):
+        if self.read_only:
+            raise RuntimeError("Database is opened read-only")
+
+    @contextmanager
+    def open_file(self, mode="r"):
+        if mode != "r":
+            self.check_writable()
+        with self.lock.shared() if mode == "r" else self.lock.exclusive():
+            if self.buffer is not None:
+                yield self.buffer
+                return
+
+            self.validate()
+            with self.storage.open(mode, self.use_mmap) as file:
+                yield file
+
+    def fingerprint(self):
+        checksum = 0
+        with open(self.filename, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                checksum = zlib.crc32(chunk, checksum)
+        return [os.path.getsize(self.filename), checksum]
+
+    def load_buffer(self):
+        self.validate()
+        with self.storage.open("r") as file:
+            self.buffer = LineBuffer(file.readlines())
+
+    def recover(self):
+        if not os.path.exists(self.wal_filename):
+            return
+
+        base, records = read_wal(self.wal_filename)
+        # A WAL whose base doesn't match the file was already folded in before a crash
+        if records and base == self.fingerprint():
+            self.load_buffer()
+            self.replaying = True
+            try:
+                for operation, *args in records:
+                    if operation in WAL_OPERATIONS:
+                        try:
+                            getattr(self, operation)(*args)
+                        except (ValueError, IndexError):
+                            continue
+            finally:
+                self.replaying = False
+            lines = self.buffer.lines
+            self.buffer = None
+            self.storage.replace(lines)
+            self.build_index()
+        os.remove(self.wal_filename)
+
+    def start_wal(self):
+        self.load_buffer()
+        self.wal.reset(self.fingerprint())
+        self.wal_ops = 0
+
+    def log_operation(self, *record):
+        # Called under the write lock so records are in the order the writes were applied
+        if self.wal is None or self.replaying:
+            return None
+        seq = self.wal.append(list(record))
+        self.wal_ops += 1
+        if self.wal_ops >= self.checkpoint_every:
+            self.checkpoint()
+        return seq
+
+    def wait_logged(self, seq):
+        # Called after the write lock is released, so concurrent writers can share one fsync
+        if seq is not None and self.wal is not None:
+            self.wal.wait(seq)
+
+    @timed
+    def checkpoint(self):
+        if self.wal is None:
+            return
+        with self.lock.exclusive():
+            self.wal.sync()
+            self.storage.replace(self.buffer.lines)
+            self.written()
+            self.wal.reset(self.fingerprint())
+            self.wal_ops = 0
+
+    def close(self):
+        if self.wal is not None:
+            self.checkpoint()
+            self.wal.close()
+            os.remove(self.wal_filename)
+            self.wal = None
+            self.buffer = None
+            self.lock.unpin()
+        self.lock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def snapshot(self):
+        directory, name = os.path.split(os.path.abspath(self.filename))
+        handle, filename = tempfile.mkstemp(prefix=name + ".snapshot-", dir=directory)
+        os.close(handle)
+        return Snapshot(filename, self.storage.name, self.clone(filename))
+
+    def clone(self, filename):
+        # Copies the file and its column indexes as they are now, returns the files written
+        self.reconcile()
+        files = [filename]
+        try:
+            if self.wal is not None:
+                # The buffer is the database in WAL mode, a copy of its lines is consistent by itself
+                with self.open_file("r") as file:
+                    lines = list(file.lines)
+                    indexes = self.indexed_columns(file)
+                BACKENDS[self.storage.name](filename).replace(lines)
+            else:
+                indexes = self.clone_file_unlocked(filename)
+            for table_name, column in indexes:
+                files.append(filename + self.column_index_filename(table_name, column)[len(self.filename):])
+                clone_file(self.column_index_filename(table_name, column), files[-1])
+            return files
+        except BaseException:
+            for path in files:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+    def clone_file_unlocked(self, filename):
+        # A full copy can take a while, so it runs without the lock and is kept only if no write landed meanwhile
+        for _ in range(CLONE_ATTEMPTS):
+            with self.open_file("r") as file:
+                indexes = self.indexed_columns(file)
+                key = self.stat_key()
+            clone_file(self.filename, filename)
+            with self.lock.shared():
+                if self.stat_key() == key:
+                    return indexes
+        # Writers kept getting in, copy under the lock rather than retry forever
+        with self.open_file("r") as file:
+            clone_file(self.filename, filename)
+            return self.indexed_columns(file)
+
+    def indexed_columns(self, file):
+        return [(table_name, column) for table_line, table_name in self.get_tables_from_meta(file)
+                for column in self.get_columns_from_table(file, table_line) if self.has_column_index(table_name, column)]
+
+    def stats(self):
+        stats = self.metrics.snapshot()
+        stats['counters']['block_cache_hits'] = self.block_cache.hits
+        stats['counters']['block_cache_misses'] = self.block_cache.misses
+        stats['file_size'] = os.path.getsize(self.filename)
+        return stats
+
+    def begin(self):
+        if self.wal is not None:
+            raise RuntimeError("Batches are not available in WAL mode, the WAL already groups writes")
+        if self.buffer is not None:
+            raise RuntimeError("A batch is already in progress")
+        self.check_writable()
+        self.lock.pin()
+        try:
+            self.reconcile()
+            self.load_buffer()
+        except BaseException:
+            self.lock.unpin()
+            raise
+
+    @timed
+    def commit(self):
+        if self.buffer is None:
+            raise RuntimeError("No batch in progress")
+        with self.lock.exclusive():
+            lines = self.buffer.lines
+            self.buffer = None
+            self.storage.replace(lines)
+            self.written()
+        self.lock.unpin()
+
+    def rollback(self):
+        if self.buffer is None:
+            raise RuntimeError("No batch in progress")
+        self.buffer = None
+        self.invalidate_hash_indexes()
+        self.lock.unpin()
+
+    @contextmanager
+    def batch(self):
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def export(self, filename, backend="text"):
+        if isinstance(backend, str):
+            backend = BACKENDS[backend](filename)
+        self.reconcile()
+        with self.open_file("r") as file:
+            backend.replace(line + '\n' for line in self.iter_lines(file, 1, file.line_count()))
+
     def update_meta(self):
         try:
-            with open(self.filename, "r+") as f:
+            with self.storage.open("r+") as f:
                 self.update_updated_to_meta(f)
         except Exception as e:
             print(f"Error updating meta: {e}")
 
+    @timed
     def update_updated_to_meta(self, file):
         self.overwrite_line(file, LN_UPDATED, "updated: " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
 
+    @timed
     def overwrite_line(self, file: TextIOWrapper, line_number, content=""):
-        file.seek(0)
-        lines = file.readlines()
+        return file.overwrite_line(line_number, content)
 
-        if 0 <= line_number - 1 < len(lines):
-            lines[line_number - 1] = str(content) + '\n'
-        else:
-            raise IndexError("Line number out of range")
+    def overwrite_line_padded(self, file: TextIOWrapper, line_number, content=""):
+        return file.overwrite_line_padded(line_number, content)
 
-        file.seek(0)
-        file.truncate()
-        file.writelines(lines)
-        file.flush()
+    def tombstone_lines(self, file: TextIOWrapper, line_number, count):
+        return file.tombstone_lines(line_number, count)
 
+    @timed
     def insert_line(self, file: TextIOWrapper, line_number, content=""):
-        file.seek(0)
-        lines = file.readlines()
-        lines.insert(line_number - 1, str(content) + '\n')
-        file.seek(0)
-        file.truncate()
-        file.writelines(lines)
-        file.flush()
+        return file.insert_line(line_number, content)
+
+    @timed
+    def read_all_lines(self, file: TextIOWrapper):
+        return file.readlines()
+
+    @timed
+    def write_lines(self, file: TextIOWrapper, lines):
+        return file.write_lines(lines)
 
     def append_line(self, file: TextIOWrapper, content=""):
-        file.seek(0, 2)
-        file.write(content + '\n')
-        file.flush()
+        return file.append_line(content)
 
     def read_line(self, file: TextIOWrapper, line_number):
-        file.seek(0)
+        return file.read_line(line_number)
 
-        for i, line in enumerate(file, start=1):
-            if i == line_number:
-                return line.rstrip('\n')
+    def read_lines(self, file: TextIOWrapper, line_number, count):
+        return file.read_lines(line_number, count)
 
-        raise IndexError("Line number out of range")
+    def iter_lines(self, file: TextIOWrapper, line_number, count):
+        return file.iter_lines(line_number, count)
 
     def delete_line(self, file, line_number):
-        file.seek(0)
-        lines = file.readlines()
-
-        if 0 <= line_number - 1 < len(lines):
-            del lines[line_number - 1]
-        else:
-            raise IndexError("Line number out of range")
-
-        file.seek(0)
-        file.truncate()
-        file.writelines(lines)
-        file.flush()
+        return file.delete_line(line_number)
 
     def get_lines_from_meta(self, file: TextIOWrapper):
         return int(self.read_line(file, LN_LINES).strip().split(": ")[1])
 
+    @timed
     def update_lines_to_meta(self, file: TextIOWrapper, amount):
         num_lines = self.get_lines_from_meta(file)
         num_lines += amount
         self.overwrite_line(file, LN_LINES, f"lines: {num_lines}")
 
     def get_tables_from_meta(self, file: TextIOWrapper):
-        tables = self.read_line(file, LN_TABLES).strip().split(": ")[1]
-        return json.loads(tables)
+        if isinstance(file, LineBuffer):
+            return json.loads(self.read_line(file, LN_TABLES).strip().split(": ")[1])
+
+        if self.tables_cache is None:
+            self.tables_cache = json.loads(self.read_line(file, LN_TABLES).strip().split(": ")[1])
+        return [list(table) for table in self.tables_cache]
+
+    def get_rows_from_table(self, file: TextIOWrapper, table_line):
+        if isinstance(file, LineBuffer):
+            return parse_rows_line(self.read_line(file, table_line + 5))[0]
+
+        if table_line not in self.rows_cache:
+            self.rows_cache[table_line] = parse_rows_line(self.read_line(file, table_line + 5))[0]
+        return self.rows_cache[table_line]
+
+    def get_stats_from_table(self, file: TextIOWrapper, table_line):
+        return parse_rows_line(self.read_line(file, table_line + 5))[1]
     
+    @timed
     def list_tables(self):
-        with open(self.filename, "r") as file:
+        with self.open_file("r") as file:
             tables = [table[1] for table in self.get_tables_from_meta(file)]
             return tables
             
@@ -123,19 +440,22 @@ class TextDatabase:
                 return table[0]
         raise ValueError("Table not found")
 
+    @timed
     def add_table_to_meta(self, file: TextIOWrapper, table_name, line_number):
         tables = self.get_tables_from_meta(file)
         tables.append([line_number, table_name])
         self.overwrite_line(file, LN_TABLES, f"tables: {json.dumps(tables)}")
     
+    @timed
     def check_table_exists(self, table_name):
-        with open(self.filename, "r") as file:
+        with self.open_file("r") as file:
             tables = self.get_tables_from_meta(file)
             for table in tables:
                 if table[1] == table_name:
                     return True
             return False
 
+    @timed
     def update_tables_to_meta(self, file: TextIOWrapper, table_name, amount):
         tables = self.get_tables_from_meta(file)
         table_line = self.get_table_line_from_list(tables, table_name)
@@ -149,94 +469,699 @@ class TextDatabase:
 
         self.overwrite_line(file, LN_TABLES, f"tables: {json.dumps(tables)}")
 
+    @timed
     def delete_tables_to_meta(self, file: TextIOWrapper, table_name):
         tables = self.get_tables_from_meta(file)
         tables = [table for table in tables if table[1] != table_name]
-        self.overwrite_line(file, LN_TABLES, f"tables: {json.dumps(tables)}")
+        self.overwrite_line_padded(file, LN_TABLES, f"tables: {json.dumps(tables)}")
 
+    @timed
     def add_table(self, table_name, columns=[]):
-        with open(self.filename, "r+") as file:
+        with self.open_file("r+") as file:
             content = {
                 'name': table_name,
                 'created': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
                 'updated': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-                'columns': columns,
-                'rows': 0,
+                'columns': encode_value(columns),
             }
             lines_to_add = ["\nTABLE"] + [f'{key}: {val}' for key, val in content.items()]
+            lines_to_add.append(format_rows_line(0, new_stats(len(columns)), STATS_PADDING))
             self.append_line(file, "\n".join(lines_to_add))
 
             self.add_table_to_meta(file, table_name, self.get_lines_from_meta(file) + 1)
             self.update_lines_to_meta(file, 7)
             self.update_updated_to_meta(file)
+            seq = self.log_operation("add_table", table_name, columns)
+        self.wait_logged(seq)
     
+    @timed
     def update_table_updated(self, file, table_name):
         table_line_number = self.get_table_line_from_meta(file, table_name)
         self.overwrite_line(file, table_line_number + 3, f"updated: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}")
         self.update_updated_to_meta(file)
 
+    def splice_rows(self, lines, tables, table_name, rows):
+        table_line = self.get_table_line_from_list(tables, table_name)
+        num_rows, stats = parse_rows_line(lines[table_line + 4])
+
+        position = table_line + 5 + num_rows
+        new_lines = []
+        for row in rows:
+            line = self.encode_row(row)
+            new_lines.append(line + '\n')
+            if stats is not None:
+                add_row(stats, decode_row(line) if isinstance(row, str) else row)
+        lines[position:position] = new_lines
+        lines[table_line + 4] = format_rows_line(num_rows + len(new_lines), stats, STATS_PADDING) + '\n'
+        lines[table_line + 2] = f"updated: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}\n"
+
+        for table in tables:
+            if table[0] > table_line:
+                table[0] += len(new_lines)
+
+        self.index_added_rows(table_name, num_rows, new_lines)
+        return len(new_lines)
+
+    def encode_row(self, row):
+        row = encode_row(row)
+        if is_tombstone(row) or '\n' in row:
+            raise ValueError(f"Rows cannot contain newlines or start with '{TOMBSTONE}'")
+        return row
+
+    def row_spellings(self, row):
+        # Rows stored before the JSON codec are matched by the text they were written with
+        spellings = [row if isinstance(row, str) else str(row)]
+        try:
+            encoded = self.encode_row(row)
+        except ValueError:
+            return spellings
+        return [encoded] + [spelling for spelling in spellings if spelling != encoded]
+
+    def tables_from_lines(self, lines):
+        return json.loads(lines[LN_TABLES - 1].strip().split(": ")[1])
+
+    def splice_meta(self, lines, tables, amount):
+        num_lines = int(lines[LN_LINES - 1].strip().split(": ")[1])
+        lines[LN_LINES - 1] = f"lines: {num_lines + amount}\n"
+        lines[LN_UPDATED - 1] = "updated: " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()) + '\n'
+        lines[LN_TABLES - 1] = f"tables: {json.dumps(tables)}\n"
+
+    def append_rows_to_log(self, table_name, rows):
+        with self.open_file("r+") as file:
+            self.get_table_line_from_meta(file, table_name)
+            added = 0
+            with open(self.log_filename, "a") as log:
+                for row in rows:
+                    log.write(json.dumps([table_name, self.encode_row(row)]) + '\n')
+                    added += 1
+            return added
+
+    @timed
+    def reconcile(self):
+        if self.buffer is not None or self.read_only or not os.path.exists(self.log_filename):
+            return
+
+        with self.lock.exclusive():
+            # Another thread or process may have folded the log in while we waited
+            if not os.path.exists(self.log_filename):
+                return
+
+            pending = {}
+            with open(self.log_filename, "r") as log:
+                for record in log:
+                    if record.strip():
+                        table_name, row = json.loads(record)
+                        pending.setdefault(table_name, []).append(row)
+
+            if pending:
+                with self.open_file("r+") as file:
+                    lines = self.read_all_lines(file)
+                    tables = self.tables_from_lines(lines)
+                    added = 0
+                    names = [table[1] for table in tables]
+                    for table_name, rows in pending.items():
+                        if table_name in names:
+                            added += self.splice_rows(lines, tables, table_name, rows)
+                    self.splice_meta(lines, tables, added)
+                    self.write_lines(file, lines)
+            os.remove(self.log_filename)
+
+    def create_hash_index(self, table_name):
+        with self.open_file("r") as file:
+            self.get_table_line_from_meta(file, table_name)
+        self.hash_indexes[table_name] = None
+
+    def drop_hash_index(self, table_name):
+        self.hash_indexes.pop(table_name, None)
+
+    def invalidate_hash_indexes(self):
+        for table_name in self.hash_indexes:
+            self.hash_indexes[table_name] = None
+
+    def get_hash_index(self, file, table_name, table_line):
+        if self.hash_indexes[table_name] is None:
+            index = {}
+            num_rows = self.get_rows_from_table(file, table_line)
+            for position, row in enumerate(self.read_lines(file, table_line + 6, num_rows)):
+                if not is_tombstone(row):
+                    index.setdefault(row, []).append(position)
+            self.hash_indexes[table_name] = index
+        return self.hash_indexes[table_name]
+
+    def index_added_rows(self, table_name, first_position, new_lines):
+        index = self.hash_indexes.get(table_name)
+        if index is None:
+            return
+        for position, line in enumerate(new_lines, start=first_position):
+            index.setdefault(line.rstrip('\n'), []).append(position)
+
+    def index_removed_rows(self, table_name, row, positions):
+        index = self.hash_indexes.get(table_name)
+        if index is None or row not in index:
+            return
+        remaining = [position for position in index[row] if position not in positions]
+        if remaining:
+            index[row] = remaining
+        else:
+            del index[row]
+
+    def find_rows(self, file, table_name, table_line, spellings):
+        # Positions of the rows stored as any of the spellings, by spelling, in one pass over the table
+        if table_name in self.hash_indexes:
+            index = self.get_hash_index(file, table_name, table_line)
+            return {spelling: list(index[spelling]) for spelling in spellings if spelling in index}
+
+        found = {}
+        num_rows = self.get_rows_from_table(file, table_line)
+        for position, line in enumerate(self.iter_lines(file, table_line + 6, num_rows)):
+            if line in spellings:
+                found.setdefault(line, []).append(position)
+        return found
+
+    @timed
+    def check_row_exists(self, table_name, row):
+        self.reconcile()
+        with self.open_file("r") as file:
+            table_line = self.get_table_line_from_meta(file, table_name)
+            return bool(self.find_rows(file, table_name, table_line, self.row_spellings(row)))
+
+    def get_columns_from_table(self, file: TextIOWrapper, table_line):
+        return decode_row(self.read_line(file, table_line + 4).strip().split(": ", 1)[1])
+
+    def column_index_filename(self, table_name, column):
+        return f"{self.filename}.{table_name}.{column}.idx"
+
+    def table_checksum(self, file, table_line, num_rows):
+        return zlib.crc32(file.read_bytes(table_line + 6, num_rows))
+
+    def index_column_rows(self, file, table_line, column_index, first_position, num_rows):
+        entries = []
+        rows = self.read_lines(file, table_line + 6 + first_position, num_rows)
+        for position, line in enumerate(rows, start=first_position):
+            try:
+                entries.append([column_value(decode_row(line), column_index), position])
+            except (ValueError, SyntaxError, IndexError):
+                continue
+        return entries
+
+    def build_column_index(self, file, table_name, column, index=None):
+        table_line = self.get_table_line_from_meta(file, table_name)
+        columns = self.get_columns_from_table(file, table_line)
+        if column not in columns:
+            raise ValueError("Column not found")
+        column_index = columns.index(column)
+        num_rows = self.get_rows_from_table(file, table_line)
+
+        entries = []
+        first_position = 0
+        if index is not None and index["rows"] <= num_rows and \
+                self.table_checksum(file, table_line, index["rows"]) == index["checksum"]:
+            # Only rows were appended since the index was saved, index just the tail
+            entries = [list(entry) for entry in zip(index["values"], index["positions"])]
+            first_position = index["rows"]
+        entries += self.index_column_rows(file, table_line, column_index, first_position, num_rows - first_position)
+        entries.sort(key=lambda entry: (sort_key(entry[0]), entry[1]))
+
+        index = {
+            'table': table_name,
+            'column': column,
+            'rows': num_rows,
+            'checksum': self.table_checksum(file, table_line, num_rows),
+            'values': [entry[0] for entry in entries],
+            'positions': [entry[1] for entry in entries],
+        }
+        if not self.read_only:
+            self.save_column_index(index)
+        return index
+
+    def save_column_index(self, index):
+        # Readers rebuild stale indexes under the shared lock, so each one writes its own temp file
+        filename = self.column_index_filename(index["table"], index["column"])
+        directory, name = os.path.split(os.path.abspath(filename))
+        handle, temp_filename = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(handle, "w") as index_file:
+                json.dump(index, index_file)
+            os.replace(temp_filename, filename)
+        except BaseException:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+
+    def load_column_index(self, file, table_name, column):
+        index = self.column_indexes.get((table_name, column))
+        if index is not None and index["stat"] == self.stat:
+            return index
+
+        if index is None:
+            if not os.path.exists(self.column_index_filename(table_name, column)):
+                raise ValueError("Column index not found")
+            with open(self.column_index_filename(table_name, column), "r") as index_file:
+                index = json.load(index_file)
+
+        table_line = self.get_table_line_from_meta(file, table_name)
+        num_rows = self.get_rows_from_table(file, table_line)
+        if index["rows"] != num_rows or self.table_checksum(file, table_line, num_rows) != index["checksum"]:
+            index = self.build_column_index(file, table_name, column, index)
+        return self.remember_column_index(index)
+
+    def remember_column_index(self, index):
+        index["stat"] = self.stat
+        index["keys"] = [sort_key(value) for value in index["values"]]
+        self.column_indexes[(index["table"], index["column"])] = index
+        return index
+
+    @timed
+    def create_column_index(self, table_name, column):
+        self.check_writable()
+        if self.buffer is not None:
+            raise RuntimeError("Column indexes cannot be created inside a batch or in WAL mode")
+        self.reconcile()
+        with self.open_file("r") as file:
+            self.remember_column_index(self.build_column_index(file, table_name, column))
+
+    def drop_column_index(self, table_name, column):
+        self.check_writable()
+        self.column_indexes.pop((table_name, column), None)
+        if os.path.exists(self.column_index_filename(table_name, column)):
+            os.remove(self.column_index_filename(table_name, column))
+
+    def has_column_index(self, table_name, column):
+        return os.path.exists(self.column_index_filename(table_name, column))
+
+    def index_positions(self, file, table_name, column, low=None, high=None):
+        index = self.load_column_index(file, table_name, column)
+        start = 0 if low is None else bisect_left(index["keys"], sort_key(low))
+        end = len(index["keys"]) if high is None else bisect_right(index["keys"], sort_key(high))
+        return sorted(index["positions"][start:end])
+
+    @timed
+    def find_by_column_range(self, table_name, column, low=None, high=None):
+        if self.buffer is not None:
+            raise RuntimeError("Column indexes cannot be used inside a batch or in WAL mode")
+        self.reconcile()
+        with self.open_file("r") as file:
+            table_line = self.get_table_line_from_meta(file, table_name)
+            return [decode_row(self.read_line(file, table_line + 6 + position))
+                    for position in self.index_positions(file, table_name, column, low, high)]
+
+    def find_by_column(self, table_name, column, value):
+        return self.find_by_column_range(table_name, column, value, value)
+
+    @timed
     def add_row_to_table(self, table_name, row):
-        with open(self.filename, "r+") as file:
-            table_line_number = self.get_table_line_from_meta(file, table_name)
-
-            rows = int(self.read_line(file, table_line_number + 5).strip().split(": ")[1])
-            self.insert_line(file, table_line_number + rows + 6, row)
-            self.overwrite_line(file, table_line_number + 5, f'rows: {rows + 1}')
-            self.update_lines_to_meta(file, 1)
-            self.update_tables_to_meta(file, table_name, 1)
-            self.update_updated_to_meta(file)
-            self.update_table_updated(file, table_name)
-        
-    def delete_row_from_table(self, table_name, row):
-        with open(self.filename, "r+") as file:
-            table_line_number = self.get_table_line_from_meta(file, table_name)
-
-            rows = int(self.read_line(file, table_line_number + 5).strip().split(": ")[1])
-            deleted_rows = 0
-            i = rows
-            while i > 0:
-                row_number = table_line_number + 5 + i
-                if self.read_line(file, row_number) == row:
-                    self.delete_line(file, row_number)
-                    self.update_lines_to_meta(file, -1)
-                    deleted_rows += 1
-                else:
-                    i -= 1
-            if deleted_rows:
-                self.update_updated_to_meta(file)
-                self.overwrite_line(file, table_line_number + 5, f'rows: {rows - deleted_rows}')
-                self.update_table_updated(file, table_name)
+        if self.append_only and self.buffer is None:
+            self.append_rows_to_log(table_name, [row])
+        else:
+            self.add_rows_to_table(table_name, [row])
 
-    def delete_table(self, table_name):
-        with open(self.filename, "r+") as file:
-            tables = self.get_tables_from_meta(file)
+    @timed
+    def add_rows_to_table(self, table_name, rows):
+        if self.append_only and self.buffer is None:
+            return self.append_rows_to_log(table_name, rows)
 
-            table_line = 0
-            for table in tables:
-                if table[1] == table_name:
-                    table_line = table[0]
-                    break
+        if self.wal is not None:
+            rows = [self.encode_row(row) for row in rows]
+
+        self.reconcile()
+        seq = None
+        with self.open_file("r+") as file:
+            lines = self.read_all_lines(file)
+            tables = self.tables_from_lines(lines)
+            added = self.splice_rows(lines, tables, table_name, rows)
+            if added:
+                self.splice_meta(lines, tables, added)
+                self.write_lines(file, lines)
+                seq = self.log_operation("add_rows_to_table", table_name, rows)
+        self.wait_logged(seq)
+        return added
+
+    @timed
+    def delete_row_from_table(self, table_name, row):
+        self.reconcile()
+        with self.open_file("r+") as file:
+            table_line = self.get_table_line_from_meta(file, table_name)
+            num_rows, stats = parse_rows_line(self.read_line(file, table_line + 5))
+            found = self.find_rows(file, table_name, table_line, self.row_spellings(row))
+            if not found:
+                return 0
+            removed = 0
+            for spelling, positions in found.items():
+                for position in positions:
+                    self.tombstone_lines(file, table_line + 6 + position, 1)
+                    if stats is not None:
+                        remove_row(stats, decode_row(spelling))
+                self.index_removed_rows(table_name, spelling, set(positions))
+                removed += len(positions)
+            if stats is not None:
+                self.overwrite_line_padded(file, table_line + 5, format_rows_line(num_rows, stats))
+            self.update_table_updated(file, table_name)
+            # Logged as stored, a tuple row would come back from the WAL's JSON as a list
+            for spelling in found:
+                seq = self.log_operation("delete_row_from_table", table_name, spelling)
+        self.wait_logged(seq)
+        return removed
 
-            i = 1
-            while self.read_line(file, table_line) != "":
-                self.delete_line(file, table_line)
-                i += 1
-            self.delete_line(file, table_line)
+    @timed
+    def delete_table(self, table_name):
+        self.reconcile()
+        with self.open_file("r+") as file:
+            table_line = self.get_table_line_from_meta(file, table_name)
+            columns = self.get_columns_from_table(file, table_line)
+            self.tombstone_lines(file, table_line, self.get_rows_from_table(file, table_line) + 6)
 
-            self.update_tables_to_meta(file, table_name, -i)
-            self.update_lines_to_meta(file, -i)
             self.delete_tables_to_meta(file, table_name)
             self.update_updated_to_meta(file)
+            self.drop_hash_index(table_name)
+            for column in columns:
+                self.drop_column_index(table_name, column)
+            seq = self.log_operation("delete_table", table_name)
+        self.wait_logged(seq)
+
+    @timed
+    def compact(self, migrate=False):
+        self.check_writable()
+        if self.buffer is not None and self.wal is None:
+            raise RuntimeError("Cannot compact inside a batch")
+        self.reconcile()
+
+        with self.lock.exclusive():
+            if self.wal is not None:
+                self.checkpoint()
+                self.buffer = None
+
+            with self.open_file("r") as file:
+                tables = []
+                for table_line, table_name in sorted(self.get_tables_from_meta(file)):
+                    num_rows = self.get_rows_from_table(file, table_line)
+                    stats = self.get_stats_from_table(file, table_line)
+                    if migrate or not is_exact(stats):
+                        # Tables from before the statistics, or with a bound lost to a delete, get them recomputed
+                        stats = new_stats(len(self.get_columns_from_table(file, table_line)))
+                        for row in self.iter_lines(file, table_line + 6, num_rows):
+                            if not is_tombstone(row):
+                                add_row(stats, decode_row(row))
+                    tables.append((table_line, table_name, num_rows, stats))
+                self.storage.replace(self.compacted_lines(file, tables, migrate))
+            self.build_index()
+            if self.wal is not None:
+                self.start_wal()
+
+    def migrate(self):
+        self.compact(migrate=True)
+
+    def compacted_lines(self, file, tables, migrate=False):
+        new_tables = []
+        line_number = LN_TABLES + 1
+        for table_line, table_name, num_rows, stats in tables:
+            new_tables.append([line_number + 1, table_name])
+            line_number += stats["count"] + 7
+
+        yield "META\n"
+        yield f"lines: {line_number}\n"
+        yield self.read_line(file, LN_CREATED) + '\n'
+        yield "updated: " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()) + '\n'
+        yield f"tables: {json.dumps(new_tables)}\n"
+        for table_line, table_name, num_rows, stats in tables:
+            yield "\n"
+            header = list(self.iter_lines(file, table_line, 5))
+            if migrate:
+                header[4] = f"columns: {encode_value(self.get_columns_from_table(file, table_line))}"
+            for line in header:
+                yield line + '\n'
+            yield format_rows_line(stats["count"], stats, STATS_PADDING) + '\n'
+            for row in self.iter_lines(file, table_line + 6, num_rows):
+                if not is_tombstone(row):
+                    yield (self.encode_row(row) if migrate else row) + '\n'
 
+    def iter_row_blocks(self, file, table_line, skip=0):
+        num_rows = self.get_rows_from_table(file, table_line)
+        # Batches and WAL mode change the buffer without touching the file, so their blocks aren't cached.
+        # Neither are tables too big for the cache, a full scan of them would only evict everything else.
+        cacheable = self.buffer is None and num_rows <= CACHE_BLOCK_ROWS * self.block_cache.maxsize
+        updated = self.read_line(file, table_line + 3) if cacheable else None
+        for first in range(0, num_rows, CACHE_BLOCK_ROWS):
+            key = (table_line, updated, first)
+            block = self.block_cache.get(key) if cacheable else None
+            if block is None:
+                # Blocks before the first skipped-to row are only counted, never decoded. The counts are kept
+                # until the next write, so paging through a table doesn't read every earlier block per page.
+                live = self.block_counts.get((table_line, first)) if self.buffer is None else None
+                if live is not None and live <= skip:
+                    skip -= live
+                    continue
+                count = min(CACHE_BLOCK_ROWS, num_rows - first)
+                lines = [row for row in self.iter_lines(file, table_line + 6 + first, count) if not is_tombstone(row)]
+                if self.buffer is None:
+                    self.block_counts[(table_line, first)] = len(lines)
+                if len(lines) <= skip:
+                    skip -= len(lines)
+                    continue
+                block = [decode_row(row) for row in lines]
+                if cacheable:
+                    self.block_cache.put(key, block)
+            if skip:
+                block, skip = block[skip:], max(skip - len(block), 0)
+            yield block
+
+    def iter_rows(self, file, table_line, start=0, limit=None):
+        rows = chain.from_iterable(self.iter_row_blocks(file, table_line, max(start, 0)))
+        for row in islice(rows, None if limit is None else max(limit, 0)):
+            # Cached rows are shared, hand out copies of the mutable ones
+            yield row.copy() if isinstance(row, (list, dict)) else row
+
+    @timed
+    def iter_table(self, table_name, start=0, limit=None):
+        self.reconcile()
+        with self.open_file("r") as file:
+            table_line = self.get_table_line_from_meta(file, table_name)
+            yield from self.iter_rows(file, table_line, start, limit)
+
+    @timed
+    def iter_sorted(self, table_name, column, descending=False, start=0, limit=None):
+        self.reconcile()
+        with self.open_file("r") as file:
+            table_line = self.get_table_line_from_meta(file, table_name)
+            columns = self.get_columns_from_table(file, table_line)
+            if column not in columns:
+                raise ValueError(f"Column not found: {column}")
+            column_index = columns.index(column)
+            stop = None if limit is None else max(start, 0) + max(limit, 0)
+
+            positions = self.sorted_positions(file, table_name, table_line, column, descending)
+            if positions is not None:
+                for position in islice(positions, max(start, 0), stop):
+                    yield decode_row(self.read_line(file, table_line + 6 + position))
+                return
+
+            def key(line):
+                try:
+                    return sort_key(column_value(decode_row(line), column_index))
+                except IndexError:
+                    return sort_key(None)
+
+            num_rows = self.get_rows_from_table(file, table_line)
+            lines = (line for line in self.iter_lines(file, table_line + 6, num_rows) if not is_tombstone(line))
+            if stop is not None:
+                runs = [top_n(lines, key, stop, descending)]
+            else:
+                runs = sort_runs(lines, key, descending, self.sort_memory, self.sort_dir)
+
+        # The runs are sorted copies, the merge doesn't need the read lock
+        for line in islice(merge_runs(runs, key, descending), max(start, 0), stop):
+            yield decode_row(line)
+
+    def sorted_positions(self, file, table_name, table_line, column, descending=False):
+        # A column index already holds the rows in order, but only rows that have the column
+        if self.buffer is not None or not self.has_column_index(table_name, column):
+            return None
+        stats = self.get_stats_from_table(file, table_line)
+        index = self.load_column_index(file, table_name, column)
+        if stats is None or len(index["positions"]) != stats["count"]:
+            return None
+        if descending:
+            values = index["values"]
+            return (index["positions"][i] for i in reverse_sorted(range(len(values)), lambda i: sort_key(values[i])))
+        return index["positions"]
+
+    @timed
+    def scan(self, table_name, predicate=None, workers=None, ordered=True, chunk_rows=SCAN_CHUNK_ROWS):
+        self.reconcile()
+        with self.open_file("r") as file:
+            table_line = self.get_table_line_from_meta(file, table_name)
+            yield from self.scan_rows(file, table_line, predicate, workers, ordered, chunk_rows)
+
+    def scan_rows(self, file, table_line, predicate=None, workers=None, ordered=True, chunk_rows=SCAN_CHUNK_ROWS):
+        if self.buffer is not None or workers == 1 or not is_picklable(predicate):
+            for row in self.iter_rows(file, table_line):
+                if predicate is None or predicate(row):
+                    yield row
+            return
+
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        # Workers read their byte range straight from the file while we hold the read lock
+        num_rows = self.get_rows_from_table(file, table_line)
+        offsets = self.storage.offsets
+        first = table_line + 5
+        pool = ProcessPoolExecutor(workers)
+        try:
+            futures = [pool.submit(scan_chunk, self.storage.name, self.filename, offsets[first + start],
+                                   offsets[first + min(start + chunk_rows, num_rows)], predicate)
+                       for start in range(0, num_rows, chunk_rows)]
+            for future in futures if ordered else as_completed(futures):
+                yield from future.result()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    @timed
+    def select(self, table_name, columns=None, where=None, workers=1):
+        self.reconcile()
+        with self.open_file("r") as file:
+            table_line = self.get_table_line_from_meta(file, table_name)
+            table_columns = self.get_columns_from_table(file, table_line)
+            for column in (columns or []) + ([where[0]] if where else []):
+                if column not in table_columns:
+                    raise ValueError(f"Column not found: {column}")
+
+            if where is None:
+                rows = self.iter_rows(file, table_line)
+            else:
+                column, op, value = where
+                condition = Condition(table_columns.index(column), op, value)
+                rows = self.select_rows(file, table_name, table_line, column, condition, workers)
+
+            projection = [table_columns.index(column) for column in columns] if columns else None
+            for row in rows:
+                yield row if projection is None else [column_value(row, i) for i in projection]
+
+    def select_rows(self, file, table_name, table_line, column, condition, workers):
+        bounds = {"=": (condition.value, condition.value), "==": (condition.value, condition.value),
+                  "<": (None, condition.value), "<=": (None, condition.value),
+                  ">": (condition.value, None), ">=": (condition.value, None)}
+        if self.buffer is None and condition.op in bounds and self.has_column_index(table_name, column):
+            for position in self.index_positions(file, table_name, column, *bounds[condition.op]):
+                row = decode_row(self.read_line(file, table_line + 6 + position))
+                if condition(row):
+                    yield row
+            return
+
+        if workers != 1 and self.buffer is None:
+            yield from self.scan_rows(file, table_line, condition, workers)
+            return
+
+        num_rows = self.get_rows_from_table(file, table_line)
+        for line in self.iter_lines(file, table_line + 6, num_rows):
+            if not is_tombstone(line) and condition.matches_line(line):
+                row = decode_row(line)
+                if condition(row):
+                    yield row
+
+    @timed
+    def aggregate(self, table_name, aggregates, where=None, group_by=None):
+        self.reconcile()
+        with self.open_file("r") as file:
+            table_line = self.get_table_line_from_meta(file, table_name)
+            table_columns = self.get_columns_from_table(file, table_line)
+            for column in [column for _, column in aggregates if column is not None] + ([group_by] if group_by else []):
+                if column not in table_columns:
+                    raise ValueError(f"Column not found: {column}")
+            aggregates = [(function, None if column is None else table_columns.index(column)) for function, column in aggregates]
+            aggregation = Aggregation(aggregates)
+
+            if where is None and group_by is None:
+                from_stats = Aggregation.from_stats(aggregates, self.get_stats_from_table(file, table_line))
+                if from_stats is not None:
+                    return [from_stats.results()]
+
+        # One pass over the matching rows, keeping a single set of running totals per group
+        rows = self.select(table_name, None, where)
+        if group_by is None:
+            for row in rows:
+                aggregation.add(row)
+            return [aggregation.results()]
+
+        group_index = table_columns.index(group_by)
+        groups = {}
+        for row in rows:
+            try:
+                value = column_value(row, group_index)
+            except IndexError:
+                value = None
+            key = encode_value(value)
+            if key not in groups:
+                groups[key] = (value, Aggregation(aggregates))
+            groups[key][1].add(row)
+        return [[value] + aggregation.results() for value, aggregation in sorted(groups.values(), key=lambda group: sort_key(group[0]))]
+
+    def live_rows(self, file, table_line):
+        stats = self.get_stats_from_table(file, table_line)
+        return self.get_rows_from_table(file, table_line) if stats is None else stats["count"]
+
+    @timed
+    def join(self, left_table, right_table, left_column, right_column, columns=None):
+        self.reconcile()
+        with self.open_file("r") as file:
+            sides = []
+            for table_name, column in ((left_table, left_column), (right_table, right_column)):
+                table_line = self.get_table_line_from_meta(file, table_name)
+                table_columns = self.get_columns_from_table(file, table_line)
+                if column not in table_columns:
+                    raise ValueError(f"Column not found: {table_name}.{column}")
+                sides.append({"table": table_name, "line": table_line, "columns": table_columns,
+                              "column": column, "index": table_columns.index(column)})
+            left, right = sides
+            projection = join_projection(left_table, left["columns"], right_table, right["columns"], columns)
+
+            # The smaller table is held in memory, the larger one is streamed or looked up through its index
+            build, probe = (left, right) if self.live_rows(file, left["line"]) <= self.live_rows(file, right["line"]) else (right, left)
+
+            if self.buffer is None and self.has_column_index(probe["table"], probe["column"]):
+                def lookup(key):
+                    for position in self.index_positions(file, probe["table"], probe["column"], key, key):
+                        yield decode_row(self.read_line(file, probe["line"] + 6 + position))
+
+                pairs = lookup_join(list(self.iter_rows(file, build["line"])), build["index"], lookup, probe["index"])
+            else:
+                pairs = hash_join(self.iter_rows(file, build["line"]), build["index"],
+                                  self.iter_rows(file, probe["line"]), probe["index"])
+            yield from joined_rows(pairs, build is left, projection)
+
+    @timed
+    def get_table_columns(self, table_name):
+        self.reconcile()
+        with self.open_file("r") as file:
+            return self.get_columns_from_table(file, self.get_table_line_from_meta(file, table_name))
+
+    @timed
     def view_table(self, table_name):
-        with open(self.filename, "r") as file:
+        self.reconcile()
+        with self.open_file("r") as file:
             table_line = self.get_table_line_from_meta(file, table_name)
-            num_rows = int(self.read_line(file, table_line + 5).strip().split(": ")[1])
-            lines = [ast.literal_eval(self.read_line(file, table_line + 4).strip().split(": ")[1])]
-            for i in range(table_line + 6, table_line + 6 + num_rows):
-                lines.append(ast.literal_eval(self.read_line(file, i)))
+            lines = [self.get_columns_from_table(file, table_line)]
+            lines.extend(self.iter_rows(file, table_line))
             return lines
 
+class Snapshot(TextDatabase):
+    def __init__(self, filename, backend, files):
+        super().__init__(filename, backend=backend, read_only=True)
+        self.files = files
+
+    def close(self):
+        super().close()
+        for path in self.files:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def open_database(path, **options):
+    # A directory, or a path ending in a separator for a new one, holds one file per table
+    if os.path.isdir(path) or path.endswith(("/", os.sep)):
+        from directory_database import DirectoryDatabase
+        return DirectoryDatabase(path, **options)
+    return TextDatabase(path, **options)
+
+
 # Main execution
 def main():
     if os.path.exists("_temp.db"):
@@ -250,18 +1175,18 @@ def main():
     db.add_table("table 2")
     db.add_table("table 3")
 
-    db.add_row_to_table("table 2", "apple")
-    db.add_row_to_table("table 2", "oranges")
-    db.add_row_to_table("table 3", "banana")
-    db.add_row_to_table("table 1", "temp row")
-    db.add_row_to_table("table 1", "temp row")
-    db.add_row_to_table("table 1", "temp row")
+    db.add_row_to_table("table 2", ["apple"])
+    db.add_row_to_table("table 2", ["oranges"])
+    db.add_row_to_table("table 3", ["banana"])
+    db.add_row_to_table("table 1", ["temp row"])
+    db.add_row_to_table("table 1", ["temp row"])
+    db.add_row_to_table("table 1", ["temp row"])
 
     db.delete_table("temp table")
 
     time.sleep(1)
 
-    db.delete_row_from_table("table 1", "temp row")
+    db.delete_row_from_table("table 1", ["temp row"])
 
     with open(file, "r") as f:
         print(f.read())
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+
+SYNC_ALWAYS = "always"
+SYNC_INTERVAL = "interval"
+SYNC_OS = "os"
+SYNC_POLICIES = (SYNC_ALWAYS, SYNC_INTERVAL, SYNC_OS)
+
+
+def read_wal(filename):
+    base = None
+    records = []
+    with open(filename, "r") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn write at the tail, everything after it was never acknowledged
+                break
+            if base is None:
+                base = record.get("base") if isinstance(record, dict) else None
+            else:
+                records.append(record)
+    return base, records
+
+
+class WriteAheadLog:
+    def __init__(self, filename, sync=SYNC_ALWAYS, interval=0.05, metrics=None):
+        if sync not in SYNC_POLICIES:
+            raise ValueError(f"Unknown sync policy: {sync}")
+        self.filename = filename
+        self.sync_policy = sync
+        self.interval = interval
+        self.metrics = metrics
+        self.file = None
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.written_seq = 0
+        self.synced_seq = 0
+        self.closed = threading.Event()
+        self.flusher = None
+        if sync == SYNC_INTERVAL:
+            self.flusher = threading.Thread(target=self.flush_periodically, daemon=True)
+            self.flusher.start()
+
+    def reset(self, base):
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "w") as file:
+            file.write(json.dumps({"base": base}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+        with self.sync_lock, self.lock:
+            if self.file is not None:
+                self.file.close()
+            os.replace(temp_filename, self.filename)
+            self.file = open(self.filename, "a")
+            self.synced_seq = self.written_seq
+
+    def append(self, record):
+        # Callers hold the database's write lock here, they wait() for the fsync only after releasing it
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            self.written_seq += 1
+            return self.written_seq
+
+    def wait(self, seq):
+        if self.sync_policy == SYNC_ALWAYS:
+            self.sync(seq)
+
+    def sync(self, seq=None):
+        # Group commit: one fsync covers every record written before it started
+        with self.sync_lock:
+            if seq is not None and self.synced_seq >= seq:
+                return
+            with self.lock:
+                target = self.written_seq
+                if self.synced_seq >= target or self.file is None:
+                    return
+                fileno = self.file.fileno()
+            os.fsync(fileno)
+            self.synced_seq = target
+        if self.metrics is not None:
+            self.metrics.add('wal_fsyncs')
+
+    def flush_periodically(self):
+        while not self.closed.wait(self.interval):
+            self.sync()
+
+    def close(self):
+        self.closed.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        self.sync()
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None